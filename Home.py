@@ -1,148 +1,152 @@
 import streamlit as st
 import pandas as pd
-import os
+from component.cube import load_cube, totals, year_month_counts
+from component.filter_spec import canonical, spec_mask
+from component.profiling import begin, panel, plotly_chart
+from component.selection import cases
+from component.summary import box_figure, grouped_box_summaries
+from component.views import view_tabs
 import plotly.express as px
 
 st.set_page_config(page_title="COVID-19 Data Dashboard",
                    page_icon=":shark:", layout="wide")
 
+begin("Home")
+
 st.title("📊 Data Overview")
 
-# Load dataset
-df = pd.read_csv(os.path.join("assets", "mapped_data.csv"))
+# Pre-aggregated case counts, the metrics and charts below are sums over
+# its cells instead of scans over the rows
+cube = load_cube()
 
-# Convert AGE to numeric (handle missing values)
-df["AGE"] = pd.to_numeric(df["AGE"], errors="coerce")
-df = df.dropna(subset=["AGE"])  # Remove NaN ages
-df["AGE"] = df["AGE"].astype(int)
+# Cases without an AGE are left out of the overview
+cube = cube[cube["AGE"].notna()]
 
 # ---- DASHBOARD METRICS ----
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    st.metric("📝 Total Cases", f"{len(df):,}")
+    st.metric("📝 Total Cases", f"{cube['COUNT'].sum():,}")
 
 with col2:
-    total_hospitalized = df[df["HOSPITALIZED"] == "YES"].shape[0]
+    total_hospitalized = totals(cube, "HOSPITALIZED").get("YES", 0)
     st.metric("🏥 Total Hospitalized", f"{total_hospitalized:,}")
 
 with col3:
-    total_male = df[df["SEX"] == "MALE"].shape[0]
-    total_female = df[df["SEX"] == "FEMALE"].shape[0]
+    sex_totals = totals(cube, "SEX")
+    total_male = sex_totals.get("MALE", 0)
+    total_female = sex_totals.get("FEMALE", 0)
     st.metric("👨 Male vs 👩 Female", f"{total_male:,} / {total_female:,}")
 
 # ---- FILTERING DATA ----
 st.sidebar.header("🔍 Filter Data")
+sexes = sex_totals.index.tolist()
 sex_filter = st.sidebar.multiselect(
-    "Select Sex", df["SEX"].unique(), default=df["SEX"].unique())
-age_range = st.sidebar.slider("Select Age Range", int(df["AGE"].min()), int(
-    df["AGE"].max()), (int(df["AGE"].min()), int(df["AGE"].max())))
+    "Select Sex", sexes, default=sexes)
+age_range = st.sidebar.slider("Select Age Range", int(cube["AGE"].min()), int(
+    cube["AGE"].max()), (int(cube["AGE"].min()), int(cube["AGE"].max())))
 outcome_filter = st.sidebar.selectbox(
-    "Select Outcome", ["All"] + df["OUTCOME"].unique().tolist())
-
-filtered_df = df[df["SEX"].isin(sex_filter)]
-filtered_df = filtered_df[(filtered_df["AGE"] >= age_range[0]) & (
-    filtered_df["AGE"] <= age_range[1])]
+    "Select Outcome", ["All"] + totals(cube, "OUTCOME").index.tolist())
 
+spec = [("SEX", "in", sex_filter), ("AGE", "between", age_range)]
 if outcome_filter != "All":
-    filtered_df = filtered_df[filtered_df["OUTCOME"] == outcome_filter]
+    spec.append(("OUTCOME", "==", outcome_filter))
+spec = canonical(spec)
 
 st.divider()
-st.write(f"📌 **Filtered Cases Count**: {len(filtered_df):,}")
-st.dataframe(filtered_df)
+st.write(
+    f"📌 **Filtered Cases Count**: {cube['COUNT'][spec_mask(cube, spec)].sum():,}")
+# Only the rows of the visible page are read
+cases(spec).table(key="overview")
 
 # ---- DASHBOARD VISUALIZATIONS ----
 st.divider()
 st.markdown("## 📊 Data Visualizations")
 
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+# Only the active view is computed
+view = view_tabs([
     "👥 Gender Distribution",
     "🏥 Hospitalization Rate",
     "🩺 Outcome Distribution",
     "📅 Admission Months Count",
     "☠️ Death Month Counts",
     "📊 Comparative Analysis"
-])
+], key="home_view")
+
+month_order = ["Jan", "Feb", "Mar", "Apr", "May",
+               "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
 
 # Gender Distribution Pie Chart
-with tab1:
+if view == "👥 Gender Distribution":
     st.subheader("👥 Gender Distribution (Pie Chart)")
-    fig1 = px.pie(df, names="SEX", title="Gender Distribution",
+    sex_counts = sex_totals.reset_index()
+    fig1 = px.pie(sex_counts, names="SEX", values="COUNT", title="Gender Distribution",
                   color_discrete_sequence=["#ff9999", "#66b3ff"])
-    st.plotly_chart(fig1, use_container_width=True)
+    plotly_chart(fig1, use_container_width=True)
 
 # Hospitalization Rate Bar Chart
-with tab2:
+elif view == "🏥 Hospitalization Rate":
     st.subheader("🏥 Hospitalization Rate (Bar Chart)")
-    hospital_counts = df["HOSPITALIZED"].value_counts().reset_index()
+    hospital_counts = totals(cube, "HOSPITALIZED").sort_values(
+        ascending=False, kind="stable").reset_index()
     hospital_counts.columns = ["Hospitalized", "Count"]
     fig2 = px.bar(hospital_counts, x="Hospitalized", y="Count", title="Hospitalization Rate",
                   color="Hospitalized", color_discrete_sequence=["#ff9999", "#66b3ff"])
-    st.plotly_chart(fig2, use_container_width=True)
+    plotly_chart(fig2, use_container_width=True)
 
 # Outcome Distribution Bar Chart
-with tab3:
+elif view == "🩺 Outcome Distribution":
     st.subheader("🩺 Outcome Distribution (Bar Chart)")
-    outcome_counts = df["OUTCOME"].value_counts().reset_index()
+    outcome_counts = totals(cube, "OUTCOME").sort_values(
+        ascending=False, kind="stable").reset_index()
     outcome_counts.columns = ["Outcome", "Count"]
     fig3 = px.bar(outcome_counts, x="Outcome", y="Count", title="Outcome Distribution",
                   color="Outcome", color_discrete_sequence=["#4CAF50", "#FFA07A", "#4682B4"])
-    st.plotly_chart(fig3, use_container_width=True)
+    plotly_chart(fig3, use_container_width=True)
 
 # Admission Months Count (Line Chart)
-with tab4:
+elif view == "📅 Admission Months Count":
     st.subheader("📅 Admission Trends Over Time (Line Chart)")
-    if "ADMISSION DATE" in df.columns:
-        df["ADMISSION_DATETIME"] = pd.to_datetime(
-            df["ADMISSION DATE"], errors='coerce')
-        df["ADMISSION_YEAR"] = df["ADMISSION_DATETIME"].dt.year
-        df["ADMISSION_MONTH"] = df["ADMISSION_DATETIME"].dt.strftime("%b")
-
-        admission_counts = df.groupby(
-            ["ADMISSION_YEAR", "ADMISSION_MONTH"]).size().reset_index(name="Count")
-
-        month_order = ["Jan", "Feb", "Mar", "Apr", "May",
-                       "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-        admission_counts["ADMISSION_MONTH"] = pd.Categorical(
-            admission_counts["ADMISSION_MONTH"], categories=month_order, ordered=True)
-        admission_counts = admission_counts.sort_values(
-            ["ADMISSION_YEAR", "ADMISSION_MONTH"])
+    if "ADMISSION_YM" in cube.columns:
+        # Months come out of the cube in calendar order
+        admission_counts = year_month_counts(cube, "ADMISSION_YM")
+        admission_counts["ADMISSION_YEAR"] = admission_counts["YEAR"]
+        admission_counts["ADMISSION_MONTH"] = pd.Categorical.from_codes(
+            admission_counts["MONTH"] - 1, categories=month_order, ordered=True)
 
         fig4 = px.line(admission_counts, x="ADMISSION_MONTH", y="Count", color="ADMISSION_YEAR", labels={
                        "ADMISSION_YEAR": "Year"}, title="Monthly Admission Trends Over the Years", markers=True)
-        st.plotly_chart(fig4, use_container_width=True)
+        plotly_chart(fig4, use_container_width=True)
     else:
         st.warning("⚠️ 'ADMISSION DATE' column not found in dataset.")
 
 # Death Month Counts (Line Chart)
-with tab5:
+elif view == "☠️ Death Month Counts":
     st.subheader("☠️ Death Trends Over Time (Line Chart)")
-    if "DATE_OF_DEATH" in df.columns:
-        df["DEATH_DATETIME"] = pd.to_datetime(
-            df["DATE_OF_DEATH"], errors='coerce')
-        df["DEATH_YEAR"] = df["DEATH_DATETIME"].dt.year
-        df["DEATH_MONTH"] = df["DEATH_DATETIME"].dt.strftime("%b")
-
-        death_counts = df.groupby(
-            ["DEATH_YEAR", "DEATH_MONTH"]).size().reset_index(name="Count")
-
-        death_counts["DEATH_MONTH"] = pd.Categorical(
-            death_counts["DEATH_MONTH"], categories=month_order, ordered=True)
-        death_counts = death_counts.sort_values(["DEATH_YEAR", "DEATH_MONTH"])
+    if "DEATH_YM" in cube.columns:
+        death_counts = year_month_counts(cube, "DEATH_YM")
+        death_counts["DEATH_YEAR"] = death_counts["YEAR"]
+        death_counts["DEATH_MONTH"] = pd.Categorical.from_codes(
+            death_counts["MONTH"] - 1, categories=month_order, ordered=True)
 
         fig5 = px.line(death_counts, x="DEATH_MONTH", y="Count", color="DEATH_YEAR", labels={
                        "DEATH_YEAR": "Year"}, title="Monthly Death Trends Over the Years", markers=True)
-        st.plotly_chart(fig5, use_container_width=True)
+        plotly_chart(fig5, use_container_width=True)
     else:
         st.warning("⚠️ 'DATE_OF_DEATH' column not found in dataset.")
 
 # ---- NEW COMPARATIVE ANALYSIS TAB ----
-with tab6:
+elif view == "📊 Comparative Analysis":
     st.subheader("📊 Comparative Analysis & Trends")
 
     # Age vs. Hospitalization Status (Box Plot)
     st.markdown(
         "### 🏥 Age Distribution of Hospitalized vs. Non-Hospitalized Cases")
-    fig6_1 = px.box(df, x="HOSPITALIZED", y="AGE", color="HOSPITALIZED",
-                    title="Age Distribution by Hospitalization Status")
-    st.plotly_chart(fig6_1, use_container_width=True)
+    age_by_status = grouped_box_summaries(
+        totals(cube, ["HOSPITALIZED", "AGE"]))
+    fig6_1 = box_figure(age_by_status, x="HOSPITALIZED", y="AGE",
+                        title="Age Distribution by Hospitalization Status")
+    plotly_chart(fig6_1, use_container_width=True)
+
+# Stage timings of this rerun, shown when DASHBOARD_PROFILE is set
+panel()
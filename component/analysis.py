@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from component.profiling import profiled
+from component.translate import yes_matrix
+
+# Ten year bands, closed on the left like pd.cut(..., right=False)
+AGE_BINS = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+AGE_LABELS = ['0-10', '10-20', '20-30', '30-40', '40-50',
+              '50-60', '60-70', '70-80', '80-90', '90-100']
+
+DISEASE_COLUMNS = ['DIABETES', 'COPD', 'ASTHMA', 'INMUSUPR', 'HYPERTENSION',
+                   'CARDIOVASCULAR', 'OBESITY', 'CHRONIC_KIDNEY', 'TOBACCO']
+
+# The aggregations below work on the int8 category codes of the loaded
+# frame and only turn codes back into labels for the result index
+
+
+@profiled
+def value_counts(series):
+    # Same as series.value_counts() without the unobserved categories
+    codes = series.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0],
+                         minlength=len(series.cat.categories))
+    counts = pd.Series(counts, index=series.cat.categories, name="count")
+    return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+
+@profiled
+def age_group_counts(ages):
+    ages = np.asarray(ages)
+    ages = ages[(ages >= AGE_BINS[0]) & (ages < AGE_BINS[-1])]
+    counts = np.bincount((ages // 10).astype(np.intp),
+                         minlength=len(AGE_LABELS))
+    index = pd.CategoricalIndex(AGE_LABELS, categories=AGE_LABELS,
+                                ordered=True, name="AGE_BIN")
+    return pd.Series(counts, index=index, name="count")
+
+
+@profiled
+def yes_counts(df, columns, where=None):
+    # Number of YES per column, optionally only among the rows in `where`
+    yes = yes_matrix(df, columns)
+    if where is not None:
+        yes = yes[where]
+    return pd.Series(np.count_nonzero(yes, axis=0), index=columns,
+                     dtype="int64")
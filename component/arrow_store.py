@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+
+import streamlit as st
+
+from component.loader import data_source, file_signature, read_data
+
+# The loaded dataset as one uncompressed Arrow IPC file that app processes
+# memory-map instead of parsing the data source:
+#
+#   python -m component.arrow_store
+#
+# Columns without missing values are used in place: the frame's arrays point
+# into the mapped file, read-only, so every session and process on the host
+# shares the same pages of the page cache. Columns with missing values are
+# converted when mapped, once per process. The file records the data source
+# it was written from and is ignored once that changes.
+
+ARROW_PATH = os.path.join("assets", "mapped_data.arrow")
+
+
+def write_arrow(source=None, output=ARROW_PATH):
+    import pyarrow as pa
+
+    source = source or data_source()
+    df = read_data(source)
+    # One record batch, so mapping it never concatenates chunks
+    table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+    table = table.replace_schema_metadata(dict(
+        table.schema.metadata or {},
+        source=os.path.normpath(source),
+        signature=json.dumps(file_signature(source))))
+    with pa.OSFile(output + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(len(table), 1))
+    os.replace(output + ".tmp", output)
+    return len(table)
+
+
+def read_arrow(path=ARROW_PATH, columns=None):
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    if columns is not None:
+        table = table.select([column for column in table.column_names
+                              if column in columns])
+    # Unsplit blocks would be consolidated into copies
+    return table.to_pandas(split_blocks=True)
+
+
+@st.cache_data(max_entries=1)
+def _written_from(path, signature):
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    if b"source" not in metadata:
+        return None
+    return (metadata[b"source"].decode(),
+            tuple(json.loads(metadata[b"signature"])))
+
+
+def is_current(source=None, path=ARROW_PATH):
+    # Whether `path` holds the current version of the data source
+    if not os.path.exists(path):
+        return False
+    source = os.path.normpath(source or data_source())
+    return _written_from(path, file_signature(path)) == (
+        source, file_signature(source))
+
+
+@st.cache_resource(show_spinner="Mapping dataset...", max_entries=8)
+def _map_arrow(path, signature, columns):
+    return read_arrow(path, columns)
+
+
+def load_arrow(source=None, columns=None, path=ARROW_PATH):
+    # One read-only frame per file version and column set, shared by every
+    # session of the process; None when the file is missing or stale
+    if not is_current(source, path):
+        return None
+    return _map_arrow(path, file_signature(path), columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write the mapped dataset as the Arrow file that app "
+                    "processes memory-map.")
+    parser.add_argument("source", nargs="?",
+                        help="CSV file or Parquet dataset "
+                             "(default: the app's data source)")
+    parser.add_argument("--output", default=ARROW_PATH,
+                        help="Arrow file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    rows = write_arrow(args.source, args.output)
+    print(f"Wrote {rows:,} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from component.analysis import DISEASE_COLUMNS
+from component.filter_spec import canonical, spec_mask
+from component.profiling import profiled
+from component.translate import yes_matrix
+
+# Disease co-occurrence of the selected cases from one pass over the rows.
+# Each case's disease flags are packed into a bitmask (bit i for
+# DISEASE_COLUMNS[i]) next to one bit per outcome, and the cases are counted
+# per packed key. Marginal and pairwise counts for any outcome are sums over
+# that table of MASKS << len(OUTCOMES) cells, and tables over disjoint rows
+# add up.
+
+# Outcome targets as `where` specs of the pages
+OUTCOMES = {
+    "ICU": canonical([("ICU", "==", "YES")]),
+    "INTUBATED": canonical([("INTUBATED", "==", "YES")]),
+    "HOSPITALIZED": canonical([("HOSPITALIZED", "==", "YES")]),
+    "DECEASED": canonical([("DATE_OF_DEATH", "notnull", True)]),
+}
+
+COLUMNS = DISEASE_COLUMNS + ["ICU", "INTUBATED", "HOSPITALIZED",
+                             "DATE_OF_DEATH"]
+
+MASKS = 1 << len(DISEASE_COLUMNS)
+
+# MASKS x diseases, 1 where the mask has the disease
+BITS = (np.arange(MASKS)[:, None] >> np.arange(len(DISEASE_COLUMNS))) & 1
+
+# Two-sided 95%
+Z = 1.959964
+
+
+def wilson_interval(successes, trials, z=Z):
+    # Score interval of a binomial proportion, missing where trials is 0
+    successes = np.asarray(successes, dtype=float)
+    trials = np.asarray(trials, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = successes / trials
+        denominator = 1 + z ** 2 / trials
+        center = (p + z ** 2 / (2 * trials)) / denominator
+        half = z * np.sqrt(p * (1 - p) / trials
+                           + z ** 2 / (4 * trials ** 2)) / denominator
+    return center - half, center + half
+
+
+def packed_keys(df):
+    # Disease bits, then one bit per outcome in OUTCOMES order
+    keys = yes_matrix(df, DISEASE_COLUMNS) @ (1 << np.arange(
+        len(DISEASE_COLUMNS)))
+    for i, spec in enumerate(OUTCOMES.values()):
+        keys |= spec_mask(df, spec).astype(np.int64) << (
+            len(DISEASE_COLUMNS) + i)
+    return keys
+
+
+class Comorbidity:
+    # Cases per outcome combination (rows) and disease mask (columns)
+
+    def __init__(self, counts=None):
+        self.counts = (np.zeros((1 << len(OUTCOMES), MASKS), dtype=np.int64)
+                       if counts is None else counts)
+
+    @classmethod
+    def from_keys(cls, keys, counts):
+        # From (packed key, cases) pairs, e.g. a GROUP BY over the keys
+        table = np.zeros((1 << len(OUTCOMES)) * MASKS, dtype=np.int64)
+        np.add.at(table, np.asarray(keys, dtype=np.int64),
+                  np.asarray(counts, dtype=np.int64))
+        return cls(table.reshape(1 << len(OUTCOMES), MASKS))
+
+    def keys(self):
+        # The non-empty cells as (packed keys, cases)
+        table = self.counts.ravel()
+        keys = np.flatnonzero(table)
+        return keys, table[keys]
+
+    def add(self, df):
+        self.counts += np.bincount(
+            packed_keys(df), minlength=self.counts.size).reshape(
+            self.counts.shape)
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def cases(self, outcome=None):
+        # Cases per disease mask, among those with `outcome` if given
+        if outcome is None:
+            return self.counts.sum(axis=0)
+        bit = list(OUTCOMES).index(outcome)
+        rows = ((np.arange(len(self.counts)) >> bit) & 1) == 1
+        return self.counts[rows].sum(axis=0)
+
+    def total(self, outcome=None):
+        return int(self.cases(outcome).sum())
+
+    def marginals(self, outcome=None):
+        # Cases with each disease, same as analysis.yes_counts()
+        return pd.Series(self.cases(outcome) @ BITS, index=DISEASE_COLUMNS,
+                         dtype="int64")
+
+    def pairs(self, outcome=None):
+        # Cases with both diseases of each pair, the marginals on the
+        # diagonal
+        cases = self.cases(outcome)
+        return pd.DataFrame(BITS.T @ (cases[:, None] * BITS),
+                            index=DISEASE_COLUMNS, columns=DISEASE_COLUMNS)
+
+    def correlation(self, outcome=None):
+        # Phi coefficient of each pair of disease flags, missing for a flag
+        # that never or always occurs
+        n = self.total(outcome)
+        both = self.pairs(outcome).to_numpy().astype(float)
+        single = np.diag(both)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            phi = (n * both - np.outer(single, single)) / np.sqrt(
+                np.outer(single * (n - single), single * (n - single)))
+        return pd.DataFrame(phi, index=DISEASE_COLUMNS,
+                            columns=DISEASE_COLUMNS)
+
+    def rates(self, outcome, z=Z):
+        # Share of the cases with each disease that had `outcome`, with its
+        # Wilson score interval
+        cases = self.marginals()
+        with_outcome = self.marginals(outcome)
+        low, high = wilson_interval(with_outcome, cases, z)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = with_outcome / cases
+        return pd.DataFrame({"CASES": cases, "OUTCOME": with_outcome,
+                             "RATE": rate, "LOW": low, "HIGH": high},
+                            index=DISEASE_COLUMNS)
+
+
+@profiled
+def comorbidity(df):
+    # Comorbidity of the rows of `df`, which needs the COLUMNS
+    return Comorbidity().add(df)
+
+
+def heatmap_figure(matrix, text_auto=True, **kwargs):
+    # Disease x disease matrix from pairs() or correlation()
+    return px.imshow(matrix, text_auto=text_auto, aspect="auto", **kwargs)
+
+
+def rates_figure(rates, **kwargs):
+    # rates() as points with their interval as error bars
+    frame = rates.reset_index(names="Disease").assign(
+        ABOVE=lambda df: df["HIGH"] - df["RATE"],
+        BELOW=lambda df: df["RATE"] - df["LOW"])
+    fig = px.scatter(frame, x="Disease", y="RATE", error_y="ABOVE",
+                     error_y_minus="BELOW", hover_data=["CASES", "OUTCOME"],
+                     **kwargs)
+    fig.update_yaxes(tickformat=".0%")
+    return fig
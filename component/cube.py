@@ -0,0 +1,158 @@
+import json
+import os
+
+import pandas as pd
+import streamlit as st
+
+from component.derived import year_month
+from component.loader import (BACKEND, convert_dtypes, data_source,
+                              file_signature, load_data, read_data)
+from component.profiling import profiled
+
+# Case counts for every observed combination of these dimensions. AGE is
+# kept at one year resolution so any age slider range is answered exactly.
+DIMENSIONS = ["SEX", "AGE", "HOSPITALIZED", "OUTCOME", "ICU", "INTUBATED",
+              "ADMISSION_YM", "DEATH_YM"]
+
+# Dimension -> source date column for the year-month keys
+YEAR_MONTH_COLUMNS = {"ADMISSION_YM": "ADMISSION DATE",
+                      "DEATH_YM": "DATE_OF_DEATH"}
+
+SOURCE_COLUMNS = [YEAR_MONTH_COLUMNS.get(d, d) for d in DIMENSIONS]
+
+CUBE_NAME = "_cube.parquet"
+
+
+def cube_path(dataset):
+    # Underscore files are skipped when the dataset itself is scanned
+    return os.path.join(dataset, CUBE_NAME)
+
+
+def build_cube(df):
+    keys = {}
+    for dimension in DIMENSIONS:
+        column = YEAR_MONTH_COLUMNS.get(dimension, dimension)
+        if dimension in df.columns:
+            # Also the year-month keys derived at ingest
+            keys[dimension] = df[dimension]
+        elif column in df.columns:
+            keys[dimension] = year_month(df[column])
+
+    keys = pd.DataFrame(keys)
+    return (keys.groupby(list(keys.columns), observed=True, dropna=False)
+            .size().reset_index(name="COUNT"))
+
+
+def tidy_cube(cube):
+    # A cube read back from plain values (SQL, JSON) with the dtypes and row
+    # order of build_cube()
+    cube = convert_dtypes(cube)
+    for dimension in YEAR_MONTH_COLUMNS:
+        cube[dimension] = cube[dimension].astype("int32")
+    return cube.sort_values(DIMENSIONS, kind="stable").reset_index(drop=True)
+
+
+def merge_cubes(*cubes):
+    # Counts are additive, so a cube over more rows is the sum of the cubes
+    # over its parts
+    merged = convert_dtypes(pd.concat(cubes, ignore_index=True))
+    keys = [column for column in merged.columns if column != "COUNT"]
+    return (merged.groupby(keys, observed=True, dropna=False)["COUNT"].sum()
+            .reset_index())
+
+
+def batches(dataset):
+    # Digests of the ingested batches counted in the stored cube
+    import pyarrow.parquet as pq
+
+    path = cube_path(dataset)
+    if not os.path.exists(path):
+        return []
+    metadata = pq.read_schema(path).metadata or {}
+    return json.loads(metadata.get(b"batches", b"[]"))
+
+
+def _save(cube, dataset, batches=()):
+    # Replaced in one step so a running app never reads half a file, the
+    # batches counted in it along in the file's metadata
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = cube_path(dataset)
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    table = table.replace_schema_metadata(dict(
+        table.schema.metadata, batches=json.dumps(list(batches))))
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def write_cube(df, dataset, batch=None):
+    _save(build_cube(df), dataset, [batch] if batch else [])
+
+
+def append_cube(df, dataset, batch=None):
+    # Folds the rows of a new batch into the stored cube, unless they were
+    # counted already; a dataset without one is summarized from scratch
+    path = cube_path(dataset)
+    counted = batches(dataset)
+    if batch is not None and batch in counted:
+        return
+    if os.path.exists(path):
+        cube = merge_cubes(pd.read_parquet(path), build_cube(df))
+    else:
+        cube = build_cube(read_data(dataset, columns=SOURCE_COLUMNS))
+    _save(cube, dataset, counted + [batch] if batch else counted)
+
+
+@profiled
+def totals(cube, by, where=None):
+    if where is not None:
+        cube = cube[where]
+    return cube.groupby(by, observed=True)["COUNT"].sum()
+
+
+@profiled
+def year_month_counts(cube, dimension, where=None):
+    counts = totals(cube, dimension, where)
+    counts = counts[counts.index > 0]
+    return pd.DataFrame({"YEAR": counts.index // 100,
+                         "MONTH": counts.index % 100,
+                         "Count": counts.to_numpy()})
+
+
+@st.cache_data(show_spinner="Loading summary...", max_entries=1)
+def _load_cube(path, signature):
+    # Written by component.ingest next to the Parquet dataset, built from the
+    # rows when the app runs straight off the CSV
+    if os.path.isdir(path) and os.path.exists(cube_path(path)):
+        return pd.read_parquet(cube_path(path))
+    return build_cube(load_data(columns=SOURCE_COLUMNS))
+
+
+@st.cache_data(show_spinner="Aggregating store...", max_entries=1)
+def _load_store_cube(path, signature):
+    from component.sql_store import load_store
+
+    return load_store(path).cube()
+
+
+@st.cache_data(show_spinner="Loading summary...", max_entries=1, ttl=600)
+def _load_service_cube(url):
+    from component.service_client import load_client
+
+    return load_client(url).cube()
+
+
+@profiled
+def load_cube():
+    if BACKEND == "service":
+        from component.service_client import SERVICE_URL
+
+        return _load_service_cube(SERVICE_URL)
+    if BACKEND == "sqlite":
+        # Imported here, sql_store builds on this module
+        from component.sql_store import STORE_PATH
+
+        return _load_store_cube(STORE_PATH, file_signature(STORE_PATH))
+    path = data_source()
+    return _load_cube(path, file_signature(path))
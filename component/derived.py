@@ -0,0 +1,34 @@
+import pandas as pd
+
+# Columns worked out from the dates once, at ingest, so the pages group and
+# filter on integers and never parse or format a date on a rerun
+
+# yyyymm keys, 0 when there is no date
+YEAR_MONTH_COLUMNS = {"SYMPTOM_YM": "DATE_OF_FIRST_SYMPTOM",
+                      "ADMISSION_YM": "ADMISSION DATE",
+                      "DEATH_YM": "DATE_OF_DEATH"}
+
+# Whole days from the first date to the second, missing if either is
+INTERVAL_COLUMNS = {
+    "SYMPTOM_TO_ADMISSION_DAYS": ("DATE_OF_FIRST_SYMPTOM", "ADMISSION DATE"),
+    "ADMISSION_TO_DEATH_DAYS": ("ADMISSION DATE", "DATE_OF_DEATH"),
+}
+
+DERIVED_COLUMNS = ["ADMISSION_YEAR", "ADMISSION_MONTH"] + list(
+    YEAR_MONTH_COLUMNS) + list(INTERVAL_COLUMNS)
+
+
+def year_month(dates):
+    return (dates.dt.year * 100 + dates.dt.month).fillna(0).astype("int32")
+
+
+def add_derived_columns(df):
+    # The admission year and month also partition the Parquet dataset
+    admission = df["ADMISSION DATE"]
+    derived = {"ADMISSION_YEAR": admission.dt.year.astype("Int16"),
+               "ADMISSION_MONTH": admission.dt.month.astype("Int8")}
+    for column, source in YEAR_MONTH_COLUMNS.items():
+        derived[column] = year_month(df[source])
+    for column, (start, end) in INTERVAL_COLUMNS.items():
+        derived[column] = (df[end] - df[start]).dt.days.astype("Int16")
+    return df.assign(**derived)
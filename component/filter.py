@@ -1,65 +1,190 @@
-import streamlit as st
 import pandas as pd
+import streamlit as st
 
-
-def filter(df):
-    df['DATE_OF_FIRST_SYMPTOM'] = pd.to_datetime(
-        df['DATE_OF_FIRST_SYMPTOM'], format='%Y-%m-%d')
-
-    df['ADMISSION DATE'] = pd.to_datetime(
-        df['ADMISSION DATE'], format='%Y-%m-%d')
-
-    df['DATE_OF_DEATH'] = pd.to_datetime(
-        df['DATE_OF_DEATH'], format='%Y-%m-%d')
+from component.filter_index import FilterIndex
+from component.filter_spec import canonical
+from component.loader import data_source, file_signature, load_data
+from component.profiling import profiled
+from component.selection_cache import SelectionCache
+
+# Every column the filter widgets read, pages load these plus their own
+FILTER_COLUMNS = ["SEX", "AGE", "SPEAKS_NATIVE_LANGUAGE", "ORIGIN", "MIGRANT",
+                  "SECTOR", "PNEUMONIA", "COPD", "CARDIOVASCULAR", "OBESITY",
+                  "PREGNANCY", "ASTHMA", "CHRONIC_KIDNEY", "TOBACCO",
+                  "DIABETES", "INMUSUPR", "HYPERTENSION", "OTHER_DISEASE",
+                  "ANOTHER_CASE", "DATE_OF_FIRST_SYMPTOM", "DATE_OF_DEATH",
+                  "HOSPITALIZED", "ADMISSION DATE", "ICU", "INTUBATED",
+                  "OUTCOME"]
+
+# Options of the YES/NO widgets
+YES_NO = ["All", "YES", "NO"]
+
+# Widgets choosing values of a column, with the rows of each option shown:
+# column -> op of its predicate, nothing chosen or "All" leaves it out
+CHOICES = {"SEX": "in", "SPEAKS_NATIVE_LANGUAGE": "==", "ORIGIN": "==",
+           "MIGRANT": "==", "SECTOR": "in", "PNEUMONIA": "==", "COPD": "==",
+           "CARDIOVASCULAR": "==", "OBESITY": "==", "PREGNANCY": "==",
+           "ASTHMA": "==", "CHRONIC_KIDNEY": "==", "TOBACCO": "==",
+           "DIABETES": "==", "INMUSUPR": "==", "HYPERTENSION": "==",
+           "OTHER_DISEASE": "==", "ANOTHER_CASE": "==", "HOSPITALIZED": "==",
+           "ICU": "==", "INTUBATED": "==", "OUTCOME": "=="}
+
+# Range widgets, always applied; "Death Date" only with Death YES
+RANGES = ["AGE", "DATE_OF_FIRST_SYMPTOM", "ADMISSION DATE"]
+
+
+@st.cache_resource(show_spinner="Indexing dataset...", max_entries=1)
+def _load_index(path, signature):
+    # Selections are memoized per filter spec across sessions
+    return FilterIndex(load_data(columns=FILTER_COLUMNS),
+                       cache=SelectionCache())
+
+
+@profiled
+def load_index():
+    # Built once per dataset version and shared read-only by every session
+    path = data_source()
+    return _load_index(path, file_signature(path))
+
+
+def _key(column):
+    return f"filter_{column}"
+
+
+def _bounds(index, column):
+    everything = index.select(())
+    return index.min(column, everything), index.max(column, everything)
+
+
+def _known(bounds):
+    return not (pd.isna(bounds[0]) or pd.isna(bounds[1]))
+
+
+def _range(value, bounds):
+    # A date range still being picked has one end only
+    return tuple(value) if value is not None and len(value) == 2 else bounds
+
+
+def _range_predicate(column, value, bounds):
+    # A column without a single value, e.g. DATE_OF_DEATH in data without
+    # deaths, has no range to pick; its range keeps the rows with a value
+    if not _known(bounds):
+        return column, "notnull", True
+    return column, "between", _range(value, bounds)
+
+
+def _submitted_spec(bounds):
+    # The spec of the filter values last submitted, defaults before that.
+    # Read from the widget state ahead of the widgets, whose options need
+    # the counts of this spec.
+    state = st.session_state
+    spec = []
+    for column, op in CHOICES.items():
+        value = state.get(_key(column))
+        if value and value != "All":
+            spec.append((column, op, value))
+    for column in RANGES:
+        spec.append(_range_predicate(column, state.get(_key(column)),
+                                     bounds[column]))
+    death = state.get(_key("DEATH"), "All")
+    if death == "YES":
+        spec.append(_range_predicate(
+            "DATE_OF_DEATH", state.get(_key("DATE_OF_DEATH")),
+            bounds["DATE_OF_DEATH"]))
+    elif death == "NO":
+        spec.append(("DATE_OF_DEATH", "isnull", True))
+    return canonical(spec)
+
+
+@profiled
+def facet_counts(index, spec):
+    # Rows per option of every choice widget, together with the other
+    # widgets' predicates: one grouped pass over the selection for the
+    # columns the spec leaves free, and one per column it restricts
+    restricted = {column for column, _, _ in spec if column in CHOICES}
+    counts = index.facet_counts(
+        [column for column in CHOICES if column not in restricted],
+        index.select(spec))
+    for column in restricted:
+        rest = canonical([p for p in spec if p[0] != column])
+        counts.update(index.facet_counts([column], index.select(rest)))
+    return counts
+
+
+def _choice(label, column, options, counts, multiple=False):
+    # Option labels carry their counts, so the widget is created anew when
+    # the counts change; its submitted value is carried over by key
+    key = _key(column)
+    st.session_state[key] = st.session_state.get(
+        key, [] if multiple else options[0])
+
+    def option_label(option):
+        if option == "All":
+            return option
+        return f"{option} ({counts.get(option, 0):,})"
+
+    widget = st.multiselect if multiple else st.selectbox
+    return widget(label, options, key=key, format_func=option_label)
+
+
+def filter_spec(index):
+    # Renders the filter panel and returns the spec of its submitted values.
+    # Changes apply together on "Apply filters". Ranges span the whole data:
+    # bounds following the other filters would reset a range submitted
+    # together with them.
+    bounds = {column: _bounds(index, column)
+              for column in RANGES + ["DATE_OF_DEATH"]}
+    spec = _submitted_spec(bounds)
+    counts = facet_counts(index, spec)
+    state = st.session_state
+
+    def choice(label, column, options=YES_NO):
+        return _choice(label, column, options, counts[column])
+
+    def date_range(label, column, help=None):
+        if not _known(bounds[column]):
+            # No dates to pick between
+            state[_key(column)] = None
+            return st.date_input(label, None, key=_key(column), help=help,
+                                 disabled=True)
+        return st.date_input(label, bounds[column], key=_key(column),
+                             help=help)
 
     # Filter the dataset below
     # st.write("Filter")
-    with st.expander("Filter"):
+    with st.expander("Filter"), st.form("filter_form", border=False):
         st.write("Demographics")
 
         # Create columns
         col1, col2 = st.columns(2)
 
         with col1:
-            sex = st.multiselect(
-                "Sex", ["FEMALE", "MALE", "UNKNOWN"])
-
-            if sex:
-                df = df[df['SEX'].isin(sex)]
+            _choice("Sex", "SEX", ["FEMALE", "MALE", "UNKNOWN"],
+                    counts["SEX"], multiple=True)
 
         with col2:
-            max_age = df['AGE'].max()
-            min_age = df['AGE'].min()
-            age = st.slider("AGE",
-                            min_age, max_age, (min_age, max_age))
-
-            df = df[(df['AGE'] >= age[0]) & (df['AGE'] <= age[1])]
+            min_age, max_age = bounds["AGE"]
+            st.slider("AGE", min_age, max_age, (min_age, max_age),
+                      key=_key("AGE"))
 
         col3, col12, col13 = st.columns(3)
 
         with col3:
-            speak_native = st.selectbox(
-                "Speaks Native Language", ["All", "YES", "NO"])
-            if speak_native != "All":
-                df = df[df['SPEAKS_NATIVE_LANGUAGE'] == speak_native]
+            choice("Speaks Native Language", "SPEAKS_NATIVE_LANGUAGE")
 
         with col12:
-            origin = st.selectbox(
-                "Origin", ["All"] + list(df['ORIGIN'].unique()))
-
-            if origin != "All":
-                df = df[df['ORIGIN'] == origin]
+            # Origins with rows left, and the one chosen
+            origin = state.get(_key("ORIGIN"), "All")
+            choice("Origin", "ORIGIN", ["All"] + sorted(
+                set(counts["ORIGIN"]) | ({origin} - {"All"})))
 
         with col13:
-            migrant = st.selectbox("Migrant", ["All", "YES", "NO"])
-            if migrant != "All":
-                df = df[df['MIGRANT'] == migrant]
-
-        sector = st.multiselect(
-            "Sector", list(df['SECTOR'].unique()))
+            choice("Migrant", "MIGRANT")
 
-        if sector:
-            df = df[df['SECTOR'].isin(sector)]
+        sector = state.get(_key("SECTOR"), [])
+        _choice("Sector", "SECTOR",
+                sorted(set(counts["SECTOR"]) | set(sector)),
+                counts["SECTOR"], multiple=True)
 
         st.divider()
         st.write("Symptoms")
@@ -67,87 +192,35 @@ def filter(df):
         col4, col5, col6 = st.columns(3)
 
         with col4:
-            pneumonia = st.selectbox("Pneumonia", ["All", "YES", "NO"])
-            if pneumonia != "All":
-                df = df[df['PNEUMONIA'] == pneumonia]
-
-            copd = st.selectbox("COPD", ["All", "YES", "NO"])
-            if copd != "All":
-                df = df[df['COPD'] == copd]
-
-            cardiovascular = st.selectbox(
-                "Cardiovascular", ["All", "YES", "NO"])
-            if cardiovascular != "All":
-                df = df[df['CARDIOVASCULAR'] == cardiovascular]
-
-            obesity = st.selectbox("Obesity", ["All", "YES", "NO"])
-            if obesity != "All":
-                df = df[df['OBESITY'] == obesity]
+            choice("Pneumonia", "PNEUMONIA")
+            choice("COPD", "COPD")
+            choice("Cardiovascular", "CARDIOVASCULAR")
+            choice("Obesity", "OBESITY")
 
         with col5:
-            pregnancy = st.selectbox("Pregnancy", ["All", "YES", "NO"])
-            if pregnancy != "All":
-                df = df[df['PREGNANCY'] == pregnancy]
-
-            asthma = st.selectbox("Asthma", ["All", "YES", "NO"])
-            if asthma != "All":
-                df = df[df['ASTHMA'] == asthma]
-
-            chronic_kidney = st.selectbox(
-                "Chronic Kidney", ["All", "YES", "NO"])
-            if chronic_kidney != "All":
-                df = df[df['CHRONIC_KIDNEY'] == chronic_kidney]
-
-            tobacco = st.selectbox("Tobacco", ["All", "YES", "NO"])
-            if tobacco != "All":
-                df = df[df['TOBACCO'] == tobacco]
+            choice("Pregnancy", "PREGNANCY")
+            choice("Asthma", "ASTHMA")
+            choice("Chronic Kidney", "CHRONIC_KIDNEY")
+            choice("Tobacco", "TOBACCO")
 
         with col6:
-            diabetes = st.selectbox("Diabetes", ["All", "YES", "NO"])
-            if diabetes != "All":
-                df = df[df['DIABETES'] == diabetes]
-
-            inmusupr = st.selectbox("Inmunosuppression", ["All", "YES", "NO"])
-            if inmusupr != "All":
-                df = df[df['INMUSUPR'] == inmusupr]
-
-            hypertension = st.selectbox("Hypertension", ["All", "YES", "NO"])
-            if hypertension != "All":
-                df = df[df['HYPERTENSION'] == hypertension]
-
-            other_disease = st.selectbox("Other Disease", ["All", "YES", "NO"])
-            if other_disease != "All":
-                df = df[df['OTHER_DISEASE'] == other_disease]
+            choice("Diabetes", "DIABETES")
+            choice("Inmunosuppression", "INMUSUPR")
+            choice("Hypertension", "HYPERTENSION")
+            choice("Other Disease", "OTHER_DISEASE")
 
         col9, col10 = st.columns(2)
         with col9:
-            another_case = st.selectbox("Another Case", ["All", "YES", "NO"])
-            if another_case != "All":
-                df = df[df['ANOTHER_CASE'] == another_case]
+            choice("Another Case", "ANOTHER_CASE")
 
         with col10:
-            # get date range
-            min_date = df['DATE_OF_FIRST_SYMPTOM'].min()
-            max_date = df['DATE_OF_FIRST_SYMPTOM'].max()
-
-            date_range = st.date_input(
-                "Date of First Symptoms", (min_date, max_date))
-
-            if date_range:
-                df = df[(df['DATE_OF_FIRST_SYMPTOM'] >= pd.to_datetime(date_range[0])) &
-                        (df['DATE_OF_FIRST_SYMPTOM'] <= pd.to_datetime(date_range[1]))]
-
-        death = st.selectbox("Death", ["All", "YES", "NO"])
-        if death == "YES":
-            death_date_min = df['DATE_OF_DEATH'].min()
-            death_date_max = df['DATE_OF_DEATH'].max()
-            death_date = st.date_input(
-                "Death Date", (death_date_min, death_date_max))
-            if death_date:
-                df = df[(df['DATE_OF_DEATH'] >= pd.to_datetime(death_date[0])) &
-                        (df['DATE_OF_DEATH'] <= pd.to_datetime(death_date[1]))]
-        elif death == "NO":
-            df = df[df['DATE_OF_DEATH'].isnull()]
+            date_range("Date of First Symptoms", "DATE_OF_FIRST_SYMPTOM")
+
+        # Always shown: the form only reruns the page on submit, so a
+        # range revealed by choosing YES would not appear until then
+        st.selectbox("Death", YES_NO, key=_key("DEATH"))
+        date_range("Death Date", "DATE_OF_DEATH",
+                   help="Only applies when Death is YES")
 
         st.divider()
         st.write("Hospitalization")
@@ -155,34 +228,19 @@ def filter(df):
         col7, col8 = st.columns(2)
 
         with col7:
-            hospitalized = st.selectbox("Hospitalized", ["All", "YES", "NO"])
-            if hospitalized != "All":
-                df = df[df['HOSPITALIZED'] == hospitalized]
-
-            addmission_date_min = df['ADMISSION DATE'].min()
-            addmission_date_max = df['ADMISSION DATE'].max()
-            addmission_date = st.date_input(
-                "Admission Date", (addmission_date_min, addmission_date_max
-                                   ))
-            if addmission_date:
-                df = df[(df['ADMISSION DATE'] >= pd.to_datetime(addmission_date[0])) &
-                        (df['ADMISSION DATE'] <= pd.to_datetime(addmission_date[1]))]
+            choice("Hospitalized", "HOSPITALIZED")
+            date_range("Admission Date", "ADMISSION DATE")
 
         with col8:
-            icu = st.selectbox("ICU", ["All", "YES", "NO"])
-            if icu != "All":
-                df = df[df['ICU'] == icu]
-
-            intubar = st.selectbox("Intubated", ["All", "YES", "NO"])
-            if intubar != "All":
-                df = df[df['INTUBATED'] == intubar]
+            choice("ICU", "ICU")
+            choice("Intubated", "INTUBATED")
 
         st.divider()
         st.write("Outcome")
 
-        outcome = st.selectbox(
-            "Outcome", ["All", "POSITIVE", "NEGATIVE", "PENDING"])
-        if outcome != "All":
-            df = df[df['OUTCOME'] == outcome]
+        choice("Outcome", "OUTCOME",
+               ["All", "POSITIVE", "NEGATIVE", "PENDING"])
+
+        st.form_submit_button("Apply filters")
 
-        return df
+    return spec
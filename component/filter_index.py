@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from component.loader import CATEGORY_COLUMNS, DATE_COLUMNS, FLAG_COLUMNS
+
+RANGE_COLUMNS = ["AGE"] + DATE_COLUMNS
+
+
+class FilterIndex:
+    # Precomputed selections over one loaded frame. Selections are packed
+    # bitmaps (one bit per row, np.packbits layout) so combining predicates
+    # is a bitwise AND and the frame is only sliced once at the end.
+
+    def __init__(self, df, cache=None):
+        self.size = len(df)
+        self.cache = cache
+
+        # One bitmap per observed (column, value) for the categorical columns,
+        # built straight from the int8 category codes
+        self.codes = {}
+        self.values = {}
+        self.bitmaps = {}
+        for column in FLAG_COLUMNS + CATEGORY_COLUMNS:
+            if column not in df.columns:
+                continue
+            series = df[column]
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.astype("category")
+            codes = series.cat.codes.to_numpy()
+            self.codes[column] = codes
+            self.values[column] = list(series.cat.categories)
+            for code in np.flatnonzero(np.bincount(codes[codes >= 0])):
+                self.bitmaps[(column, self.values[column][code])] = \
+                    np.packbits(codes == code)
+
+        # Non-null values sorted once, with the row each one came from, so a
+        # range predicate is two binary searches
+        self.sorted = {}
+        self.nulls = {}
+        for column in RANGE_COLUMNS:
+            if column not in df.columns:
+                continue
+            values = df[column].to_numpy()
+            null = df[column].isna().to_numpy()
+            rows = np.flatnonzero(~null)
+            order = np.argsort(values[rows], kind="stable")
+            self.sorted[column] = (values[rows][order], rows[order])
+            self.nulls[column] = np.packbits(null)
+
+    def all(self):
+        return np.packbits(np.ones(self.size, dtype=bool))
+
+    def none(self):
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def equals(self, column, value):
+        bitmap = self.bitmaps.get((column, value))
+        return self.none() if bitmap is None else bitmap
+
+    def isin(self, column, values):
+        bitmap = self.none()
+        for value in values:
+            bitmap = bitmap | self.equals(column, value)
+        return bitmap
+
+    def isnull(self, column):
+        return self.nulls[column]
+
+    def notnull(self, column):
+        return self.all() & ~self.nulls[column]
+
+    def between(self, column, low, high):
+        # Inclusive on both ends, nulls never match
+        if pd.isna(low) or pd.isna(high):
+            return self.none()
+        values, rows = self.sorted[column]
+        if column in DATE_COLUMNS:
+            low = pd.Timestamp(low).to_datetime64().astype(values.dtype)
+            high = pd.Timestamp(high).to_datetime64().astype(values.dtype)
+        start = np.searchsorted(values, low, "left")
+        stop = np.searchsorted(values, high, "right")
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows[start:stop]] = True
+        return np.packbits(mask)
+
+    def predicate(self, column, op, value):
+        if op == "==":
+            return self.equals(column, value)
+        if op == "in":
+            return self.isin(column, value)
+        if op == "between":
+            return self.between(column, value[0], value[1])
+        if op == "isnull":
+            return self.isnull(column)
+        if op == "notnull":
+            return self.notnull(column)
+        raise ValueError(f"Unknown filter operator: {op}")
+
+    def select(self, spec):
+        # Rows matching every predicate of a canonical filter spec
+        if self.cache is not None:
+            bitmap = self.cache.get(spec)
+            if bitmap is not None:
+                return bitmap
+
+        bitmap = self.all()
+        for column, op, value in spec:
+            bitmap &= self.predicate(column, op, value)
+
+        if self.cache is not None:
+            self.cache.put(spec, bitmap)
+        return bitmap
+
+    def mask(self, bitmap):
+        return np.unpackbits(bitmap, count=self.size).astype(bool)
+
+    def rows(self, bitmap):
+        return np.flatnonzero(self.mask(bitmap))
+
+    def count(self, bitmap):
+        return int(np.bitwise_count(bitmap).sum())
+
+    def facet_counts(self, columns, bitmap):
+        # Selected rows per value of each column, values with none left out:
+        # {column: {value: rows}}, from one pass over the selected codes
+        rows = self.rows(bitmap)
+        counts = {}
+        for column in columns:
+            codes = self.codes[column][rows]
+            found = np.bincount(codes[codes >= 0],
+                                minlength=len(self.values[column]))
+            counts[column] = {self.values[column][code]: int(found[code])
+                              for code in np.flatnonzero(found)}
+        return counts
+
+    def min(self, column, bitmap):
+        return self._first(column, bitmap, last=False)
+
+    def max(self, column, bitmap):
+        return self._first(column, bitmap, last=True)
+
+    def _first(self, column, bitmap, last):
+        values, rows = self.sorted[column]
+        selected = np.flatnonzero(self.mask(bitmap)[rows])
+        if not len(selected):
+            return pd.NaT if column in DATE_COLUMNS else np.nan
+        value = values[selected[-1] if last else selected[0]]
+        return pd.Timestamp(value) if column in DATE_COLUMNS else value
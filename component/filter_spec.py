@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+from component.loader import DATE_COLUMNS
+
+# A filter spec is a tuple of (column, op, value) predicates that are ANDed
+# together, with op one of "==", "in", "between", "isnull" or "notnull".
+# canonical() gives every combination of widget choices exactly one hashable
+# form.
+
+OPS = ("==", "in", "between", "isnull", "notnull")
+
+
+def _date(value):
+    if pd.isna(value):
+        return None
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def _bound(column, value):
+    if column in DATE_COLUMNS:
+        return _date(value)
+    if pd.isna(value):
+        return None
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def canonical_predicate(column, op, value):
+    if op == "in":
+        return column, op, tuple(sorted(str(v) for v in value))
+    if op == "between":
+        return column, op, (_bound(column, value[0]), _bound(column, value[1]))
+    if op in ("isnull", "notnull"):
+        return column, op, True
+    return column, op, str(value)
+
+
+def canonical(predicates):
+    # Predicates are ANDed, so their order never matters
+    return tuple(sorted({canonical_predicate(*p) for p in predicates},
+                        key=repr))
+
+
+def spec_mask(df, spec):
+    # Rows of `df` matching a spec, with the same results as
+    # FilterIndex.select() without building an index
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in spec:
+        series = df[column]
+        if op == "==":
+            mask &= (series == value).to_numpy(dtype=bool, na_value=False)
+        elif op == "in":
+            mask &= series.isin(value).to_numpy()
+        elif op == "isnull":
+            mask &= series.isna().to_numpy()
+        elif op == "notnull":
+            mask &= series.notna().to_numpy()
+        elif op == "between":
+            low, high = value
+            if pd.isna(low) or pd.isna(high):
+                mask[:] = False
+                continue
+            if column in DATE_COLUMNS:
+                low, high = pd.Timestamp(low), pd.Timestamp(high)
+            mask &= ((series >= low) & (series <= high)).to_numpy(
+                dtype=bool, na_value=False)
+        else:
+            raise ValueError(f"Unknown filter operator: {op}")
+    return mask
+
+
+def normalize(spec, index):
+    # The same rows with the fewest predicates, so specs that only differ in
+    # no-op ranges compare equal. A range covering every value left by the
+    # other predicates only drops missing values, and that is dropped too
+    # where none are left. `index` is a FilterIndex or a sql_store.Store.
+    spec = list(canonical(spec))
+    for i, (column, op, value) in enumerate(spec):
+        if op != "between":
+            continue
+        rest = index.select(canonical(spec[:i] + spec[i + 1:]))
+        low = _bound(column, index.min(column, rest))
+        high = _bound(column, index.max(column, rest))
+        if None in (low, high, *value):
+            continue
+        if value[0] <= low and high <= value[1]:
+            spec[i] = (column, "notnull", True)
+
+    for predicate in list(spec):
+        column, op, _ = predicate
+        if op != "notnull":
+            continue
+        rest = [p for p in spec if p != predicate]
+        if not index.count(index.select(canonical(
+                rest + [(column, "isnull", True)]))):
+            spec.remove(predicate)
+    return canonical(spec)
+
+
+def spec_from_json(predicates):
+    # [[column, op, value], ...] as written in JSON, lists for tuples
+    return canonical([(column, op, tuple(value) if isinstance(value, list)
+                       else value) for column, op, value in predicates])
@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+from component.cube import append_cube, write_cube
+from component.derived import add_derived_columns
+from component.loader import (DATA_PATH, MANIFEST_NAME, PARQUET_PATH,
+                              convert_dtypes, open_dataset, read_data)
+from component.reverse_mapping import codebook
+from component.translate import to_labels
+
+PARTITION_COLUMNS = ["ADMISSION_YEAR", "ADMISSION_MONTH"]
+
+# Large enough for efficient scans, small enough for min/max statistics on
+# AGE and the date columns to skip row groups
+ROW_GROUP_SIZE = 128 * 1024
+
+# Files of a month smaller than this are merged by compact_dataset()
+COMPACT_BELOW = 32 * 1024 * 1024
+
+# Left in a month directory by compact_dataset() until the month's files
+# are swapped for the merged one; hidden from readers by the leading dot
+COMPACT_FILE = ".compact.parquet"
+COMPACT_JOURNAL = ".compact.json"
+
+
+def decode_raw(df):
+    # Raw extracts carry the integer codes, the app works on the labels
+    for column in df.columns:
+        if codebook(column) is not None:
+            df[column] = to_labels(df[column], column)
+    return convert_dtypes(df)
+
+
+def check_codebook(df, raw=False):
+    # Every coded column may only hold the labels (or with `raw`, the integer
+    # codes) listed in reverse_mapping
+    problems = []
+    for column in df.columns:
+        mapping = codebook(column)
+        if mapping is None:
+            continue
+        allowed = set(mapping.values()) if raw else set(mapping)
+        unknown = sorted({value for value in df[column].dropna().unique()
+                          if value not in allowed}, key=str)
+        if unknown:
+            problems.append(f"{column}: {', '.join(map(str, unknown))}")
+    if problems:
+        raise ValueError("values outside the codebook in "
+                         + "; ".join(problems))
+
+
+def read_source(source, raw=False, strict=False):
+    df = pd.read_csv(source, low_memory=False) if raw else read_data(source)
+    if strict:
+        check_codebook(df, raw)
+    return decode_raw(df) if raw else df
+
+
+def source_digest(source):
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ingested(output):
+    path = os.path.join(output, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.split()[0] for line in f if line.strip()}
+
+
+def record_source(source, output, digest=None):
+    # The manifest is rewritten in one step: a batch is in the dataset once
+    # it is listed, and the app's data version changes with it
+    path = os.path.join(output, MANIFEST_NAME)
+    lines = []
+    if os.path.exists(path):
+        with open(path) as f:
+            lines = f.readlines()
+    lines.append(f"{digest or source_digest(source)} "
+                 f"{os.path.basename(source)}\n")
+    with open(path + ".tmp", "w") as f:
+        f.writelines(lines)
+    os.replace(path + ".tmp", path)
+
+
+def _batch_name(digest):
+    # Appended files are named after their source, so appending a source
+    # again overwrites its files instead of adding rows
+    return digest[:16]
+
+
+def _unrecorded(path, recorded):
+    # A file of an appended batch the manifest does not list yet
+    parts = os.path.basename(path).split("-")
+    return (len(parts) == 3 and len(parts[1]) == 16
+            and parts[1] not in recorded)
+
+
+def _write_table(table, output, basename_template):
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(
+        table.select(PARTITION_COLUMNS).schema, flavor="hive")
+
+    # Categorical columns are stored dictionary encoded, dates as timestamps
+    file_options = ds.ParquetFileFormat().make_write_options(
+        compression="zstd", use_dictionary=True, write_statistics=True)
+
+    ds.write_dataset(table, output, format="parquet",
+                     partitioning=partitioning, file_options=file_options,
+                     max_rows_per_group=ROW_GROUP_SIZE,
+                     min_rows_per_group=max(1, min(ROW_GROUP_SIZE, len(table))),
+                     basename_template=basename_template,
+                     existing_data_behavior="overwrite_or_ignore")
+
+
+def write_dataset(df, output=PARQUET_PATH):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(add_derived_columns(df),
+                                 preserve_index=False)
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    _write_table(table, output, "part-{i}.parquet")
+
+
+def append_dataset(df, output=PARQUET_PATH, digest=None):
+    # New files only: existing partitions are left untouched and a month
+    # seen before simply gains another file, named after the source `digest`
+    import pyarrow as pa
+
+    schema = open_dataset(output).schema
+    table = pa.Table.from_pandas(add_derived_columns(df),
+                                 preserve_index=False)
+    if set(table.column_names) != set(schema.names):
+        raise ValueError("columns differ from the dataset: "
+                         + ", ".join(sorted(set(table.column_names)
+                                            ^ set(schema.names))))
+    table = table.select(schema.names).cast(schema)
+    name = _batch_name(digest or uuid.uuid4().hex)
+    _write_table(table, output, f"part-{name}-{{i}}.parquet")
+
+
+def _finish_compaction(directory):
+    # Completes the compaction of one month once its journal is written, and
+    # so its merged file complete; a merged file without a journal was cut
+    # short and is dropped. The month's old files go first and the merged
+    # file takes the first one's name last, so no reader sees rows twice.
+    journal = os.path.join(directory, COMPACT_JOURNAL)
+    merged = os.path.join(directory, COMPACT_FILE)
+    if not os.path.exists(journal):
+        if os.path.exists(merged):
+            os.remove(merged)
+        return
+    with open(journal) as f:
+        names = json.load(f)
+    for name in names[1:]:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+    if os.path.exists(merged):
+        os.replace(merged, os.path.join(directory, names[0]))
+    os.remove(journal)
+
+
+def finish_compactions(output=PARQUET_PATH):
+    # Those of an earlier compact_dataset() that did not get to the end
+    for directory, _, names in os.walk(output):
+        if COMPACT_JOURNAL in names or COMPACT_FILE in names:
+            _finish_compaction(directory)
+
+
+def compact_dataset(output=PARQUET_PATH, below=COMPACT_BELOW):
+    # Every appended batch leaves one more file per month to open on each
+    # scan. A month with several files, one of them under `below` bytes, is
+    # rewritten as one file with the rows in the order they were read in.
+    # Files of a batch the manifest does not list yet are left alone.
+    # Returns the number of months rewritten.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    finish_compactions(output)
+    recorded = {_batch_name(digest) for digest in ingested(output)}
+    months = {}
+    for fragment in open_dataset(output).get_fragments():
+        if not _unrecorded(fragment.path, recorded):
+            months.setdefault(os.path.dirname(fragment.path),
+                              []).append(fragment.path)
+
+    compacted = 0
+    for directory, files in months.items():
+        if len(files) < 2 or min(map(os.path.getsize, files)) >= below:
+            continue
+        table = pa.concat_tables(pq.ParquetFile(path).read()
+                                 for path in files)
+        pq.write_table(table, os.path.join(directory, COMPACT_FILE),
+                       compression="zstd", use_dictionary=True,
+                       write_statistics=True, row_group_size=ROW_GROUP_SIZE)
+        journal = os.path.join(directory, COMPACT_JOURNAL)
+        with open(journal + ".tmp", "w") as f:
+            json.dump([os.path.basename(path) for path in files], f)
+        os.replace(journal + ".tmp", journal)
+        _finish_compaction(directory)
+        compacted += 1
+
+    manifest = os.path.join(output, MANIFEST_NAME)
+    if compacted and os.path.exists(manifest):
+        # A new data version for the app's caches
+        os.utime(manifest)
+    return compacted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert the case CSV into the partitioned Parquet "
+                    "dataset read by the dashboard.")
+    parser.add_argument("source", nargs="?", default=DATA_PATH,
+                        help="CSV file to ingest (default: %(default)s)")
+    parser.add_argument("--output", default=PARQUET_PATH,
+                        help="dataset directory (default: %(default)s)")
+    parser.add_argument("--raw", action="store_true",
+                        help="source holds the raw integer codes instead of "
+                             "the mapped labels")
+    parser.add_argument("--append", action="store_true",
+                        help="add the source to the existing dataset as a "
+                             "new batch instead of rewriting it")
+    parser.add_argument("--compact", action="store_true",
+                        help="only merge the small files of each month of "
+                             "the existing dataset, nothing is ingested")
+    args = parser.parse_args(argv)
+
+    if args.compact:
+        print(f"Compacted {compact_dataset(args.output)} months of "
+              f"{args.output}")
+        return
+
+    # A batch is ingested once the manifest lists it. Until then running
+    # again repeats it without counting rows twice: its files are named
+    # after the source and the cube records the batches it counts.
+    append = args.append and os.path.isdir(args.output)
+    digest = source_digest(args.source)
+    if append and digest in ingested(args.output):
+        print(f"{args.source} is already in {args.output}")
+        return
+
+    try:
+        df = read_source(args.source, raw=args.raw, strict=args.append)
+        if append:
+            finish_compactions(args.output)
+            append_dataset(df, args.output, digest)
+        else:
+            write_dataset(df, args.output)
+    except ValueError as e:
+        parser.error(f"{args.source}: {e}")
+
+    # Case counts behind the Home.py tiles and charts
+    if append:
+        append_cube(df, args.output, digest)
+    else:
+        write_cube(df, args.output, digest)
+    record_source(args.source, args.output, digest)
+    print(f"{'Appended' if append else 'Wrote'} {len(df):,} rows to "
+          f"{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import os
+
+import pandas as pd
+import streamlit as st
+
+from component.profiling import profiled
+from component.reverse_mapping import codebook
+
+DATA_PATH = os.path.join("assets", "mapped_data.csv")
+
+# Partitioned columnar copy of DATA_PATH written by component.ingest
+PARQUET_PATH = os.path.join("assets", "mapped_data")
+
+# Digests of the source files already in the dataset, one per line; written
+# by component.ingest after everything else it changes in the dataset
+MANIFEST_NAME = "_ingested.txt"
+
+# YES / NO / DOES NOT APPLY / IGNORED / UNKNOWN columns
+FLAG_COLUMNS = ["HOSPITALIZED", "INTUBATED", "PNEUMONIA", "PREGNANCY",
+                "SPEAKS_NATIVE_LANGUAGE", "DIABETES", "COPD", "ASTHMA",
+                "INMUSUPR", "HYPERTENSION", "OTHER_DISEASE", "CARDIOVASCULAR",
+                "OBESITY", "CHRONIC_KIDNEY", "TOBACCO", "ANOTHER_CASE",
+                "MIGRANT", "ICU"]
+
+# Other label columns
+CATEGORY_COLUMNS = ["SEX", "OUTCOME", "NATIONALITY", "ORIGIN", "SECTOR"]
+
+# Free text label columns sharing one string dictionary
+SHARED_DICTIONARY_COLUMNS = ["NATIONALITY", "ORIGIN", "SECTOR"]
+
+DATE_COLUMNS = ["DATE_OF_FIRST_SYMPTOM", "ADMISSION DATE", "DATE_OF_DEATH"]
+
+# "memory": every app process loads the data source itself; "sqlite": pages
+# query the store written by component.sql_store instead; "service": pages
+# query the component.service process
+BACKEND = os.environ.get("DASHBOARD_BACKEND", "memory")
+
+
+def data_source():
+    # Prefer the Parquet dataset once it has been ingested
+    if os.path.isdir(PARQUET_PATH):
+        return PARQUET_PATH
+    return DATA_PATH
+
+
+def file_signature(path=None):
+    # Part of the cache key, so replacing or rewriting the data invalidates
+    # every cached copy without hashing its content on each rerun
+    path = path or data_source()
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    # A single stat for a dataset kept by component.ingest, which touches
+    # the manifest last whenever it adds or rewrites files
+    manifest = os.path.join(path, MANIFEST_NAME)
+    if os.path.exists(manifest):
+        stat = os.stat(manifest)
+        return stat.st_mtime_ns, stat.st_size
+
+    mtime, size, files = 0, 0, 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            mtime = max(mtime, stat.st_mtime_ns)
+            size += stat.st_size
+            files += 1
+    return mtime, size, files
+
+
+def _labels(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return list(series.cat.categories)
+    return list(series.dropna().unique())
+
+
+def codebook_dtype(column, series):
+    # Categories ordered by their reverse_mapping code (YES, NO, DOES NOT
+    # APPLY, IGNORED, UNKNOWN) so the int8 category codes mean the same thing
+    # in every load; labels missing from the codebook are kept at the end
+    mapping = codebook(column) or {}
+    labels = sorted(mapping, key=mapping.get)
+    extra = sorted((label for label in _labels(series) if label not in mapping),
+                   key=str)
+    return pd.CategoricalDtype(labels + extra)
+
+
+def shared_dtype(frame):
+    labels = set()
+    for column in frame.columns:
+        labels.update(_labels(frame[column]))
+    return pd.CategoricalDtype(sorted(labels, key=str))
+
+
+def _recode(series, dtype):
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(dtype)
+    # astype() treats unordered dtypes with the same labels as equal and
+    # would keep the old codes
+    if series.cat.categories.equals(dtype.categories):
+        return series
+    return series.cat.set_categories(dtype.categories)
+
+
+def convert_dtypes(df):
+    # Compact in-memory form: every label column is an int8 coded categorical
+    # and labels are only materialized for display
+    for column in FLAG_COLUMNS + CATEGORY_COLUMNS:
+        if column in df.columns and column not in SHARED_DICTIONARY_COLUMNS:
+            dtype = codebook_dtype(column, df[column])
+            df[column] = _recode(df[column], dtype)
+
+    shared = [column for column in SHARED_DICTIONARY_COLUMNS
+              if column in df.columns]
+    if shared:
+        dtype = shared_dtype(df[shared])
+        for column in shared:
+            df[column] = _recode(df[column], dtype)
+
+    for column in DATE_COLUMNS:
+        if column in df.columns and not pd.api.types.is_datetime64_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], format="%Y-%m-%d",
+                                        errors="coerce")
+
+    # Ages fit in a byte; keep float only when there are missing values
+    if "AGE" in df.columns:
+        df["AGE"] = pd.to_numeric(df["AGE"], errors="coerce",
+                                  downcast="unsigned")
+
+    return df
+
+
+def plain_frame(df):
+    # Plain Python values for SQL and JSON: labels as text, dates as ISO
+    # text, missing as None
+    out = {}
+    for column in df.columns:
+        series = df[column]
+        if column in DATE_COLUMNS:
+            series = series.dt.strftime("%Y-%m-%d")
+        elif column == "AGE":
+            series = series.astype("Int64")
+        out[column] = series.astype(object).where(series.notna(), None)
+    return pd.DataFrame(out)
+
+
+def apply_filters(df, filters):
+    # Same (column, op, value) triples as pyarrow's `filters`, for the CSV path
+    ops = {
+        "==": lambda s, v: s == v,
+        "!=": lambda s, v: s != v,
+        "<": lambda s, v: s < v,
+        "<=": lambda s, v: s <= v,
+        ">": lambda s, v: s > v,
+        ">=": lambda s, v: s >= v,
+        "in": lambda s, v: s.isin(v),
+        "not in": lambda s, v: ~s.isin(v),
+    }
+    for column, op, value in filters:
+        df = df[ops[op](df[column], value)]
+    return df.reset_index(drop=True)
+
+
+def open_dataset(path=PARQUET_PATH, files=None):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    # Admission year/month directories written by component.ingest
+    partitioning = ds.partitioning(
+        pa.schema([("ADMISSION_YEAR", pa.int16()),
+                   ("ADMISSION_MONTH", pa.int8())]), flavor="hive")
+    if files is None:
+        return ds.dataset(path, format="parquet", partitioning=partitioning)
+    # Some of the dataset's files, memory-mapped so that processes reading
+    # them share the page cache instead of each buffering a copy
+    return ds.dataset(files, format="parquet", partitioning=partitioning,
+                      partition_base_dir=path,
+                      filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+def dataset_files(path=PARQUET_PATH):
+    # (file, rows) for every file of the dataset, from the footers only
+    return [(fragment.path, fragment.count_rows())
+            for fragment in open_dataset(path).get_fragments()]
+
+
+def read_columns(path=None):
+    path = path or data_source()
+    if os.path.isdir(path):
+        return open_dataset(path).schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_data(path=None, columns=None, filters=None):
+    path = path or data_source()
+    header = read_columns(path)
+    if columns is not None:
+        columns = [column for column in header if column in columns]
+
+    if os.path.isdir(path):
+        # Only the requested columns are decoded and partitions or row groups
+        # ruled out by `filters` are never read
+        import pyarrow.parquet as pq
+
+        table = open_dataset(path).to_table(
+            columns=columns,
+            filter=pq.filters_to_expression(filters) if filters else None)
+        return convert_dtypes(table.to_pandas())
+
+    df = convert_dtypes(pd.read_csv(path, **_csv_options(header, columns)))
+
+    if filters:
+        df = apply_filters(df, filters)
+    return df
+
+
+def _csv_options(header, columns):
+    selected = columns if columns is not None else header
+    dtype = {column: "category" for column in FLAG_COLUMNS + CATEGORY_COLUMNS
+             if column in selected}
+    dates = [column for column in DATE_COLUMNS if column in selected]
+    return {"usecols": columns, "dtype": dtype, "parse_dates": dates,
+            "date_format": "%Y-%m-%d"}
+
+
+def read_chunks(path=None, columns=None, chunk_rows=128 * 1024, files=None):
+    # read_data() a bounded number of rows at a time. Category codes are only
+    # consistent within a chunk, labels are the same everywhere. `files`
+    # limits a dataset to some of its files.
+    path = path or data_source()
+    header = read_columns(path)
+    if columns is not None:
+        columns = [column for column in header if column in columns]
+
+    if os.path.isdir(path):
+        import pyarrow as pa
+
+        # No read-ahead; small batches (one per partition file at least) are
+        # gathered up to chunk_rows before converting
+        pending, rows = [], 0
+        for batch in open_dataset(path, files).to_batches(
+                columns=columns, batch_size=chunk_rows, batch_readahead=0,
+                fragment_readahead=0):
+            pending.append(batch)
+            rows += batch.num_rows
+            if rows >= chunk_rows:
+                yield convert_dtypes(pa.Table.from_batches(pending).to_pandas())
+                pending, rows = [], 0
+        if pending:
+            yield convert_dtypes(pa.Table.from_batches(pending).to_pandas())
+        return
+
+    with pd.read_csv(path, chunksize=chunk_rows,
+                     **_csv_options(header, columns)) as reader:
+        for chunk in reader:
+            yield convert_dtypes(chunk)
+
+
+@st.cache_data(show_spinner="Loading dataset...", max_entries=8)
+def _load_data(path, signature, columns, filters):
+    return read_data(path, columns, filters)
+
+
+@profiled
+def load_data(columns=None, filters=None):
+    # Mapped read-only from the Arrow file written by component.arrow_store
+    # when it is current, otherwise parsed once per process and copied out
+    # of the cache for each call
+    path = data_source()
+    if columns is not None:
+        columns = list(dict.fromkeys(columns))
+    if filters is None:
+        from component.arrow_store import load_arrow
+
+        df = load_arrow(path, columns)
+        if df is not None:
+            return df
+    return _load_data(path, file_signature(path), columns, filters)
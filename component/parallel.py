@@ -0,0 +1,108 @@
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import streamlit as st
+
+from component.filter_spec import canonical, spec_from_json
+from component.loader import (data_source, dataset_files, file_signature,
+                              read_chunks)
+from component.streaming import CHUNK_ROWS, COLUMNS, aggregate_chunks
+
+# The streaming page aggregations spread over worker processes, one group of
+# Parquet files each, for data read from disk: preset precomputation, the
+# benchmark and the command line below. Workers open their files themselves
+# (memory-mapped), so only the spec, the file names and the partial totals
+# are pickled. The app's pages aggregate the frame and index they already
+# hold instead of reading the files again for every filter spec.
+# DASHBOARD_WORKERS sets the number of processes, 1 turns this off.
+
+WORKERS = (int(os.environ.get("DASHBOARD_WORKERS", "0"))
+           or min(4, os.cpu_count() or 1))
+
+# Below this many rows one process is faster than starting the others
+MIN_ROWS = 1_000_000
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool(workers=WORKERS):
+    # Started on first use and shared by every caller for the life of the
+    # process. Spawned rather than forked, the caller may run threads.
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pools[workers]
+
+
+def split(files, parts):
+    # Groups of files with about the same number of rows, largest first
+    groups = [([], 0) for _ in range(parts)]
+    for path, rows in sorted(files, key=lambda f: f[1], reverse=True):
+        i = min(range(parts), key=lambda i: groups[i][1])
+        groups[i] = (groups[i][0] + [path], groups[i][1] + rows)
+    return [paths for paths, _ in groups if paths]
+
+
+@st.cache_data(max_entries=1)
+def _dataset_rows(path, signature):
+    return sum(rows for _, rows in dataset_files(path))
+
+
+def use_workers(path=None, workers=WORKERS):
+    path = path or data_source()
+    if workers <= 1 or not os.path.isdir(path):
+        return False
+    return _dataset_rows(path, file_signature(path)) >= MIN_ROWS
+
+
+def _aggregate_files(path, files, spec, chunk_rows):
+    return aggregate_chunks(read_chunks(path, COLUMNS, chunk_rows, files),
+                            spec, cube=False)
+
+
+def aggregate_parallel(spec=(), path=None, workers=WORKERS,
+                       chunk_rows=CHUNK_ROWS):
+    # streaming.aggregate() without the cube, in one process when the data
+    # is small, a CSV file or workers is 1
+    path = path or data_source()
+    spec = canonical(spec)
+    if not use_workers(path, workers):
+        return _aggregate_files(path, None, spec, chunk_rows)
+
+    # A few groups per worker so a slow one does not hold up the rest
+    groups = split(dataset_files(path), workers * 2)
+    futures = [pool(workers).submit(_aggregate_files, path, files, spec,
+                                    chunk_rows) for files in groups]
+    totals = futures[0].result()
+    for future in futures[1:]:
+        totals.merge(future.result())
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the page aggregations of a filter spec over "
+                    "worker processes.")
+    parser.add_argument("--source", help="Parquet dataset "
+                                         "(default: the app's data source)")
+    parser.add_argument("--spec", default="[]",
+                        help="JSON list of [column, op, value] predicates")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    spec = spec_from_json(json.loads(args.spec))
+    start = time.perf_counter()
+    totals = aggregate_parallel(spec, args.source, args.workers)
+    print(f"{totals.rows:,} rows selected in "
+          f"{time.perf_counter() - start:.3f} s with {args.workers} workers")
+
+
+if __name__ == "__main__":
+    main()
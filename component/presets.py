@@ -0,0 +1,131 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import streamlit as st
+
+from component.filter import FILTER_COLUMNS
+from component.filter_index import FilterIndex
+from component.filter_spec import canonical, normalize, spec_from_json
+from component.loader import data_source, file_signature, read_data
+from component.parallel import WORKERS, aggregate_parallel
+from component.profiling import profiled
+from component.streaming import results_from_json, results_to_json
+
+# Question 1-4 results for standard filter presets, computed ahead of time
+# without Streamlit:
+#
+#   python -m component.presets assets/presets.json
+#
+# One small JSON file per preset, named after its normalized spec. The pages
+# use it when the active filter selects the same rows as a preset and
+# compute live otherwise.
+
+PRESETS_PATH = os.path.join("assets", "presets.json")
+
+RESULTS_DIR = os.path.join("assets", "presets")
+
+# The filter widgets always apply these ranges, which at their defaults only
+# leave out the cases with the value missing
+WIDGET_RANGES = ["AGE", "DATE_OF_FIRST_SYMPTOM", "ADMISSION DATE"]
+
+
+def preset_key(spec):
+    # Of a normalized spec
+    return hashlib.sha256(
+        json.dumps(spec, default=str).encode()).hexdigest()[:16]
+
+
+def widget_spec(spec):
+    # `spec` as the filter widgets produce it, with the untouched ranges
+    columns = {column for column, _, _ in spec}
+    return canonical(list(spec) + [(column, "notnull", True)
+                                   for column in WIDGET_RANGES
+                                   if column not in columns])
+
+
+def read_presets(path=PRESETS_PATH):
+    # {"name": [[column, op, value], ...], ...}, only the widgets that were
+    # changed from their defaults
+    with open(path) as f:
+        return {name: widget_spec(spec_from_json(predicates))
+                for name, predicates in json.load(f).items()}
+
+
+def precompute(presets, source=None, output=RESULTS_DIR, workers=WORKERS):
+    source = source or data_source()
+    index = FilterIndex(read_data(source, columns=FILTER_COLUMNS))
+    signature = list(file_signature(source))
+    os.makedirs(output, exist_ok=True)
+
+    for name, spec in presets.items():
+        start = time.perf_counter()
+        spec = normalize(spec, index)
+        results = aggregate_parallel(spec, source, workers).results()
+        path = os.path.join(output, preset_key(spec) + ".json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"name": name, "spec": spec, "source": source,
+                       "signature": signature,
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "results": results_to_json(results)}, f, default=str)
+        os.replace(path + ".tmp", path)
+        yield name, results["rows"], time.perf_counter() - start
+
+
+@st.cache_data(max_entries=64)
+def _read_results(path, mtime):
+    with open(path) as f:
+        return json.load(f)
+
+
+@st.cache_data(show_spinner=False, max_entries=1024)
+def _normalized_key(_index, version, spec):
+    # Normalizing takes a few selections, so it is done once per data version
+    # and filter spec rather than on every rerun
+    return preset_key(normalize(spec, _index))
+
+
+@profiled
+def preset_results(spec, index, version, directory=RESULTS_DIR):
+    # Precomputed results for the rows `spec` selects in `index` (FilterIndex
+    # or sql_store.Store) at data `version`, None unless a preset for the
+    # current data matches
+    if not os.path.isdir(directory) or not os.listdir(directory):
+        return None
+    path = os.path.join(directory,
+                        _normalized_key(index, version, spec) + ".json")
+    if not os.path.exists(path):
+        return None
+    data = _read_results(path, os.stat(path).st_mtime_ns)
+    if data["signature"] != list(file_signature(data_source())):
+        return None
+    # Written before the comorbidity table was part of the results
+    if "comorbidity" not in data["results"]:
+        return None
+    return results_from_json(data["results"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Precompute the Question 1-4 results for filter "
+                    "presets.")
+    parser.add_argument("presets", nargs="?", default=PRESETS_PATH,
+                        help="JSON file of named filter specs "
+                             "(default: %(default)s)")
+    parser.add_argument("--source", help="CSV file or Parquet dataset "
+                                         "(default: the app's data source)")
+    parser.add_argument("--output", default=RESULTS_DIR,
+                        help="results directory (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    for name, rows, seconds in precompute(read_presets(args.presets),
+                                          args.source, args.output,
+                                          args.workers):
+        print(f"{name}: {rows:,} rows in {seconds:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+import pandas as pd
+
+# Per-rerun timings, row counts and allocations for the stages of a page.
+# tracemalloc only counts for the whole process, so with other sessions
+# running at the same time the allocation numbers are approximate: they
+# include those sessions' allocations, and their stages reset the peak.
+# Off unless DASHBOARD_PROFILE is set; then every stage is also logged as one
+# JSON line to stderr, or to the file named by DASHBOARD_PROFILE_LOG.
+ENABLED = os.environ.get("DASHBOARD_PROFILE", "") not in ("", "0")
+
+logger = logging.getLogger("dashboard.profile")
+
+# Streamlit runs each session's script in its own thread
+_run = threading.local()
+
+
+class _Stage:
+    def __init__(self, name, rows_in):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.child_peak = 0
+
+
+class _NoStage:
+    # Stands in for a stage when profiling is off; attributes set on it are
+    # dropped
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def _rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+def _emit(record):
+    if not logger.handlers:
+        path = os.environ.get("DASHBOARD_PROFILE_LOG")
+        handler = (logging.FileHandler(path) if path
+                   else logging.StreamHandler(sys.stderr))
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    logger.info(json.dumps(record, default=str))
+
+
+def begin(page):
+    # Starts the records of one rerun of `page`
+    if not ENABLED:
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _run.page = page
+    _run.id = uuid.uuid4().hex[:12]
+    _run.records = []
+    _run.stack = []
+
+
+class _Timer:
+    def __init__(self, name, rows_in):
+        self.stage = _Stage(name, rows_in)
+
+    def __enter__(self):
+        stack = getattr(_run, "stack", None)
+        if stack is None:
+            begin("")
+            stack = _run.stack
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        tracemalloc.reset_peak()
+        self.start_bytes = current
+        self.start = time.perf_counter()
+        stack.append(self.stage)
+        return self.stage
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, self.stage.child_peak)
+        stack = _run.stack
+        stack.pop()
+        if stack:
+            # The parent's peak covers everything that happened in here
+            stack[-1].child_peak = max(stack[-1].child_peak, peak)
+
+        record = {"event": "stage", "page": _run.page, "run": _run.id,
+                  "stage": self.stage.name, "depth": len(stack),
+                  "seconds": round(seconds, 6),
+                  "rows_in": self.stage.rows_in,
+                  "rows_out": self.stage.rows_out,
+                  "process_allocated_bytes": current - self.start_bytes,
+                  "process_peak_bytes": peak - self.start_bytes,
+                  "error": exc_type.__name__ if exc_type else None}
+        _run.records.append(record)
+        _emit(record)
+        return False
+
+
+def stage(name, rows_in=None):
+    # with stage("aggregate", rows_in=len(df)) as s: ...; s.rows_out = n
+    if not ENABLED:
+        return _NO_STAGE
+    return _Timer(name, rows_in)
+
+
+def profiled(fn=None, name=None):
+    # Decorator form of stage(); rows in/out are taken from a DataFrame or
+    # Series first argument and return value. Returns fn itself when off.
+    if fn is None:
+        return functools.partial(profiled, name=name)
+    if not ENABLED:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with stage(name or fn.__name__,
+                   rows_in=_rows(args[0]) if args else None) as s:
+            result = fn(*args, **kwargs)
+            s.rows_out = _rows(result)
+        return result
+    return wrapper
+
+
+def plotly_chart(fig, **kwargs):
+    # st.plotly_chart, timed as its own stage since it serializes the figure
+    import streamlit as st
+
+    with stage(f"plotly_chart: {fig.layout.title.text or ''}".rstrip(": ")):
+        return st.plotly_chart(fig, **kwargs)
+
+
+def panel():
+    # Collapsible table of this rerun's stages, in the order they finished
+    if not ENABLED or not getattr(_run, "records", None):
+        return
+    import streamlit as st
+
+    records = pd.DataFrame(_run.records)
+    top = records[records["depth"] == 0]
+    with st.expander(f"Profiling: {top['seconds'].sum():.3f} s, "
+                     f"{len(records)} stages"):
+        table = records.assign(
+            stage=["  " * depth + name for depth, name
+                   in zip(records["depth"], records["stage"])],
+            process_allocated_mb=records["process_allocated_bytes"] / 2**20,
+            process_peak_mb=records["process_peak_bytes"] / 2**20)
+        st.dataframe(table[["stage", "seconds", "rows_in", "rows_out",
+                            "process_allocated_mb", "process_peak_mb",
+                            "error"]],
+                     hide_index=True)
+        st.caption("Allocations are measured for the whole process and "
+                   "include any other session running at the same time.")
+    _run.records = []
@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from component.analysis import AGE_LABELS, DISEASE_COLUMNS
+from component.comorbidity import COLUMNS as COMORBIDITY_COLUMNS
+from component.comorbidity import OUTCOMES, Z, Comorbidity, packed_keys
+from component.derived import year_month
+from component.filter import FILTER_COLUMNS
+from component.filter_index import FilterIndex
+from component.filter_spec import canonical
+from component.loader import (BACKEND, convert_dtypes, data_source,
+                              file_signature, load_data, read_data)
+from component.profiling import profiled
+from component.translate import yes_matrix
+
+# Fast preview: the page aggregations estimated from a stratified sample of
+# the cases (by SEX, ten year age band, OUTCOME and admission month), each
+# sampled case standing for WEIGHT cases of its stratum. Counts are scaled to
+# the whole data and come with the half-width of their 95% interval. Pages
+# switch back to the exact results once the filters are left alone.
+#
+#   python -m component.sample
+#
+# writes the sample for the sqlite and service backends; the memory backend
+# draws it from the loaded rows when there is no current file.
+
+SAMPLE_PATH = os.path.join("assets", "mapped_data_sample.parquet")
+
+SAMPLE_ROWS = int(os.environ.get("DASHBOARD_SAMPLE_ROWS", 100_000))
+
+# At least two per stratum, so every stratum has a variance
+MIN_PER_STRATUM = 2
+
+# Without a filter change for this long the exact results are computed
+IDLE_SECONDS = 2
+
+
+def strata(df):
+    # Stratum number of every row
+    age = df["AGE"].to_numpy(dtype=float)
+    band = np.where(np.isnan(age), -1, np.clip(age // 10, 0, 10))
+    month = (df["ADMISSION_YM"].to_numpy() if "ADMISSION_YM" in df.columns
+             else year_month(df["ADMISSION DATE"]).to_numpy())
+    keys = np.column_stack([df["SEX"].cat.codes.to_numpy(), band,
+                            df["OUTCOME"].cat.codes.to_numpy(), month])
+    return np.unique(keys, axis=0, return_inverse=True)[1].ravel()
+
+
+def draw_sample(df, rows=SAMPLE_ROWS, seed=0):
+    # A proportional share of every stratum, drawn at random, with STRATUM
+    # and WEIGHT columns added
+    stratum = strata(df)
+    population = np.bincount(stratum)
+    take = np.minimum(population, np.maximum(
+        MIN_PER_STRATUM,
+        np.rint(population * rows / max(len(df), 1)).astype(np.int64)))
+    if len(df) <= rows:
+        take = population
+
+    # Rank of each row within its stratum in a random order
+    order = np.random.default_rng(seed).permutation(len(df))
+    order = order[np.argsort(stratum[order], kind="stable")]
+    starts = np.cumsum(population) - population
+    rank = np.arange(len(df)) - starts[stratum[order]]
+    chosen = np.sort(order[rank < take[stratum[order]]])
+
+    sample = df.iloc[chosen].reset_index(drop=True)
+    return sample.assign(STRATUM=stratum[chosen].astype(np.int32),
+                         WEIGHT=(population / take)[stratum[chosen]])
+
+
+class Sample:
+    # A drawn sample with its filter index and stratum sizes
+
+    def __init__(self, df):
+        self.df = df
+        self.strata = df["STRATUM"].to_numpy()
+        self.weights = df["WEIGHT"].to_numpy()
+        self.sampled = np.bincount(self.strata)
+        self.population = np.rint(np.bincount(self.strata,
+                                              weights=self.weights))
+        self.index = FilterIndex(df)
+
+    def rows(self, spec):
+        return self.index.rows(self.index.select(spec))
+
+    def estimate(self, rows, groups=None, size=1):
+        # Cases in the whole data like the sample rows `rows`, per group
+        # (codes in [0, size)) when given, and the half-width of the 95%
+        # interval of each, from the stratified variance
+        strata = self.strata[rows]
+        groups = np.zeros(len(rows), dtype=np.int64) if groups is None \
+            else groups
+        counts = np.bincount(strata * size + groups,
+                             minlength=len(self.sampled) * size).reshape(
+            len(self.sampled), size)
+        n = self.sampled[:, None]
+        population = self.population[:, None]
+        share = counts / n
+        variance = (population ** 2 * (1 - n / population) * share
+                    * (1 - share) / np.maximum(n - 1, 1)).sum(axis=0)
+        return (population * share).sum(axis=0), Z * np.sqrt(variance)
+
+
+class SampleSelection:
+    # Estimates for the rows of `spec` from a Sample, with the aggregation
+    # methods of the exact selections; the data table and anything not
+    # estimated come from `selection`, the exact one. margin(method, *args)
+    # is the half-width of the 95% interval of each value of method(*args).
+
+    exact = False
+
+    def __init__(self, sample, spec, selection):
+        self.sample = sample
+        self.spec = spec
+        self.selection = selection
+        self.rows = sample.rows(spec)
+
+    def margin(self, method, *args):
+        return getattr(self, f"_{method}")(*args)[1]
+
+    def count(self):
+        estimate, margin = self.sample.estimate(self.rows)
+        return int(round(estimate[0])), int(round(margin[0]))
+
+    def __len__(self):
+        return self.count()[0]
+
+    def _age_group_counts(self):
+        ages = self.sample.df["AGE"].to_numpy(dtype=float)[self.rows]
+        inside = (ages >= 0) & (ages < 10 * len(AGE_LABELS))
+        estimate, margin = self.sample.estimate(
+            self.rows[inside], (ages[inside] // 10).astype(np.int64),
+            len(AGE_LABELS))
+        index = pd.CategoricalIndex(AGE_LABELS, categories=AGE_LABELS,
+                                    ordered=True, name="AGE_BIN")
+        return (pd.Series(np.rint(estimate).astype(np.int64), index=index,
+                          name="count"),
+                pd.Series(margin, index=index))
+
+    def age_group_counts(self):
+        return self._age_group_counts()[0]
+
+    def _distinct_counts(self, column):
+        values = self.sample.df[column].to_numpy()[self.rows]
+        known = ~pd.isna(values)
+        values, groups = np.unique(values[known], return_inverse=True)
+        estimate, margin = self.sample.estimate(
+            self.rows[known], groups.ravel(), len(values))
+        return (values, np.rint(estimate).astype(np.int64)), margin
+
+    def distinct_counts(self, column):
+        return self._distinct_counts(column)[0]
+
+    def _value_counts(self, column):
+        # In the order of analysis.value_counts(), unobserved values left out
+        series = self.sample.df[column]
+        codes = series.cat.codes.to_numpy()[self.rows]
+        known = codes >= 0
+        estimate, margin = self.sample.estimate(
+            self.rows[known], codes[known].astype(np.int64),
+            len(series.cat.categories))
+        counts = pd.Series(np.rint(estimate).astype(np.int64),
+                           index=series.cat.categories, name="count")
+        margin = pd.Series(margin, index=series.cat.categories)
+        counts = counts[counts > 0].sort_values(ascending=False,
+                                                kind="stable")
+        return counts, margin[counts.index]
+
+    def value_counts(self, column):
+        return self._value_counts(column)[0]
+
+    def _yes_counts(self, columns, where=()):
+        rows = self.sample.rows(canonical(list(self.spec) + list(where)))
+        yes = yes_matrix(self.sample.df.iloc[rows], list(columns))
+        estimates, margins = zip(*(self.sample.estimate(
+            rows, yes[:, i].astype(np.int64), 2)
+            for i in range(len(columns))))
+        return (pd.Series([round(e[1]) for e in estimates], index=columns,
+                          dtype="int64"),
+                pd.Series([m[1] for m in margins], index=columns))
+
+    def yes_counts(self, columns, where=()):
+        return self._yes_counts(columns, where)[0]
+
+    def comorbidity(self):
+        # Estimated cases per cell, rounded
+        keys = packed_keys(self.sample.df.iloc[self.rows][COMORBIDITY_COLUMNS])
+        table = Comorbidity()
+        table.counts = np.rint(np.bincount(
+            keys, weights=self.sample.weights[self.rows],
+            minlength=table.counts.size)).astype(np.int64).reshape(
+            table.counts.shape)
+        return table
+
+    def _marginals(self, outcome=None):
+        # Of comorbidity().marginals(outcome)
+        return self._yes_counts(DISEASE_COLUMNS,
+                                OUTCOMES[outcome] if outcome else ())
+
+    def table(self, key, transform=None):
+        self.selection.table(key, transform)
+
+
+def _written_from(path):
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(path).metadata or {}
+    if b"source" not in metadata:
+        return None
+    return (metadata[b"source"].decode(),
+            tuple(json.loads(metadata[b"signature"])))
+
+
+def write_sample(source=None, output=SAMPLE_PATH, rows=SAMPLE_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    source = source or data_source()
+    sample = draw_sample(read_data(source, columns=FILTER_COLUMNS), rows)
+    table = pa.Table.from_pandas(sample, preserve_index=False)
+    table = table.replace_schema_metadata(dict(
+        table.schema.metadata or {}, source=os.path.normpath(source),
+        signature=json.dumps(file_signature(source))))
+    pq.write_table(table, output + ".tmp")
+    os.replace(output + ".tmp", output)
+    return len(sample)
+
+
+@st.cache_resource(show_spinner="Loading sample...", max_entries=1)
+def _read_sample(path, signature):
+    return Sample(convert_dtypes(pd.read_parquet(path)))
+
+
+@st.cache_resource(show_spinner="Drawing sample...", max_entries=1)
+def _draw_sample(path, signature):
+    return Sample(draw_sample(load_data(columns=FILTER_COLUMNS)))
+
+
+def load_sample():
+    # The current sample file, else one drawn from the loaded rows; None
+    # when neither is available
+    source = data_source()
+    if os.path.exists(SAMPLE_PATH) and _written_from(SAMPLE_PATH) == (
+            os.path.normpath(source), file_signature(source)):
+        return _read_sample(SAMPLE_PATH, file_signature(SAMPLE_PATH))
+    if BACKEND == "memory":
+        return _draw_sample(source, file_signature(source))
+    return None
+
+
+@st.fragment(run_every=IDLE_SECONDS)
+def _settle():
+    # Reruns the page with the exact results once the spec has been the
+    # same for IDLE_SECONDS
+    state = st.session_state
+    if (state["exact_spec"] != state["preview_spec"]
+            and time.monotonic() - state["preview_since"] >= IDLE_SECONDS):
+        state["exact_spec"] = state["preview_spec"]
+        st.rerun()
+
+
+def _exact_now(spec):
+    st.session_state["exact_spec"] = spec
+
+
+@profiled
+def preview(spec, selection):
+    # Renders the preview switch; `selection` while it is off or the exact
+    # results for `spec` are due, a SampleSelection otherwise
+    state = st.session_state
+    if "preview" not in state:
+        state["preview"] = state.get("preview_last", False)
+    on = st.toggle("Fast preview", key="preview",
+                   help="Estimate the charts from a stratified sample while "
+                        "changing the filters")
+    state["preview_last"] = on
+    sample = load_sample() if on else None
+    if sample is None:
+        return selection
+
+    if state.get("preview_spec") != spec:
+        state["preview_spec"] = spec
+        state["preview_since"] = time.monotonic()
+    state.setdefault("exact_spec", None)
+    if state["exact_spec"] == spec:
+        return selection
+
+    estimate = SampleSelection(sample, spec, selection)
+    count, margin = estimate.count()
+    st.caption(f"Preview from a {len(sample.df):,} case sample: about "
+               f"{count:,} ± {margin:,} cases (95%). Exact results follow "
+               f"after {IDLE_SECONDS} s without changes.")
+    st.button("Compute exact", key="preview_exact", on_click=_exact_now,
+              args=(spec,))
+    _settle()
+    return estimate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Draw the stratified sample used by the fast preview.")
+    parser.add_argument("source", nargs="?",
+                        help="CSV file or Parquet dataset "
+                             "(default: the app's data source)")
+    parser.add_argument("--output", default=SAMPLE_PATH,
+                        help="sample file (default: %(default)s)")
+    parser.add_argument("--rows", type=int, default=SAMPLE_ROWS,
+                        help="about how many cases to keep "
+                             "(default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    rows = write_sample(args.source, args.output, args.rows)
+    print(f"Wrote {rows:,} sampled cases to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import numpy as np
+import streamlit as st
+
+from component.analysis import age_group_counts, value_counts, yes_counts
+from component.comorbidity import COLUMNS as COMORBIDITY_COLUMNS
+from component.comorbidity import comorbidity
+from component.filter import FILTER_COLUMNS, filter_spec, load_index
+from component.filter_spec import canonical, spec_mask
+from component.loader import BACKEND, data_source, file_signature, load_data
+from component.presets import preset_results
+from component.sample import preview
+from component.summary import distinct_counts
+from component.table import rows_table, store_table
+
+# The filtered cases of a page, whichever backend holds them. Pages ask a
+# selection for its aggregations and data table instead of touching the rows,
+# so with DASHBOARD_BACKEND=sqlite nothing but the results leaves the store.
+# `where` narrows one aggregation with extra spec predicates, e.g.
+# (("ICU", "==", "YES"),). Selections with `exact` False hold estimates
+# (component.sample) and give their error bounds with margin().
+
+
+class FrameSelection:
+    # Selected rows of a frame held in memory, kept as their positions so a
+    # shared (memory-mapped) frame is never copied as a whole; columns are
+    # taken out when an aggregation needs them
+
+    exact = True
+
+    def __init__(self, df, rows=None):
+        self.df = df
+        self.rows = np.arange(len(df)) if rows is None else rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _column(self, column):
+        return self.df[column].iloc[self.rows]
+
+    def _frame(self, columns):
+        return self.df.iloc[self.rows, [self.df.columns.get_loc(column)
+                                        for column in columns]]
+
+    def age_group_counts(self):
+        return age_group_counts(self._column("AGE"))
+
+    def distinct_counts(self, column):
+        return distinct_counts(self._column(column).to_numpy())
+
+    def value_counts(self, column):
+        return value_counts(self._column(column))
+
+    def yes_counts(self, columns, where=()):
+        where = canonical(where)
+        used = list(dict.fromkeys(
+            list(columns) + [column for column, _, _ in where]))
+        df = self._frame(used)
+        return yes_counts(df, columns,
+                          where=spec_mask(df, where) if where else None)
+
+    def comorbidity(self):
+        return comorbidity(self._frame(COMORBIDITY_COLUMNS))
+
+    def table(self, key, transform=None):
+        rows_table(self.df, self.rows, key, transform)
+
+
+class AggregatesSelection:
+    # Another selection, with the page aggregations looked up in
+    # streaming.Aggregates.results() of the same rows, precomputed for a
+    # preset (component.presets). `results` is called when first needed.
+
+    exact = True
+
+    def __init__(self, selection, results):
+        self.selection = selection
+        self.results = results
+
+    def __len__(self):
+        return len(self.selection)
+
+    def age_group_counts(self):
+        return self.results()["age_groups"]
+
+    def distinct_counts(self, column):
+        if column != "AGE":
+            return self.selection.distinct_counts(column)
+        return self.results()["ages"]
+
+    def value_counts(self, column):
+        if column != "INTUBATED":
+            return self.selection.value_counts(column)
+        return self.results()["intubated"]
+
+    def yes_counts(self, columns, where=()):
+        return self.selection.yes_counts(columns, where)
+
+    def comorbidity(self):
+        return self.results()["comorbidity"]
+
+    def table(self, key, transform=None):
+        self.selection.table(key, transform)
+
+
+class StoreSelection:
+    # Selected rows left in a sql_store.Store, as their filter spec
+
+    exact = True
+
+    def __init__(self, store, spec, columns):
+        self.store = store
+        self.spec = spec
+        self.columns = list(dict.fromkeys(columns))
+        self._count = None
+
+    def __len__(self):
+        if self._count is None:
+            self._count = self.store.count(self.spec)
+        return self._count
+
+    def _narrowed(self, where):
+        return canonical(list(self.spec) + list(where))
+
+    def age_group_counts(self):
+        return self.store.age_group_counts(self.spec)
+
+    def distinct_counts(self, column):
+        return self.store.distinct_counts(self.spec, column)
+
+    def value_counts(self, column):
+        return self.store.value_counts(self.spec, column)
+
+    def yes_counts(self, columns, where=()):
+        return self.store.yes_counts(self._narrowed(where), columns)
+
+    def comorbidity(self):
+        return self.store.comorbidity(self.spec)
+
+    def table(self, key, transform=None):
+        store_table(self.store, self.spec, self.columns, key, transform)
+
+
+class MemoizedSelection:
+    # Another selection, with its aggregations kept per data version and
+    # filter spec for every session of the process: a view shown again, or
+    # the same filter in another session, is not recomputed
+
+    exact = True
+
+    def __init__(self, selection, spec, version):
+        self.selection = selection
+        self.spec = spec
+        self.version = version
+
+    def _memo(self, method, *args):
+        return _memoized(self.selection, self.version, self.spec, method,
+                         args)
+
+    def __len__(self):
+        return self._memo("__len__")
+
+    def age_group_counts(self):
+        return self._memo("age_group_counts")
+
+    def distinct_counts(self, column):
+        return self._memo("distinct_counts", column)
+
+    def value_counts(self, column):
+        return self._memo("value_counts", column)
+
+    def yes_counts(self, columns, where=()):
+        return self._memo("yes_counts", list(columns), canonical(where))
+
+    def comorbidity(self):
+        return self._memo("comorbidity")
+
+    def table(self, key, transform=None):
+        self.selection.table(key, transform)
+
+
+@st.cache_data(show_spinner=False, max_entries=1024)
+def _memoized(_selection, version, spec, method, args):
+    return getattr(_selection, method)(*args)
+
+
+def _data_version():
+    if BACKEND == "sqlite":
+        from component.sql_store import STORE_PATH
+
+        return file_signature(STORE_PATH)
+    return file_signature(data_source())
+
+
+def _store():
+    # Where the rows are for the backends that keep them out of the process
+    if BACKEND == "service":
+        from component.service_client import load_client
+
+        return load_client()
+    from component.sql_store import load_store
+
+    return load_store()
+
+
+def select_cases(columns=FILTER_COLUMNS):
+    # Renders the filter widgets and returns the selected cases
+    if BACKEND in ("sqlite", "service"):
+        index = _store()
+        spec = filter_spec(index)
+        selection = StoreSelection(index, spec, columns)
+    else:
+        index = load_index()
+        spec = filter_spec(index)
+        selection = FrameSelection(load_data(columns=columns),
+                                   index.rows(index.select(spec)))
+
+    # The service caches its own responses and may not share the data files
+    if BACKEND != "service":
+        version = _data_version()
+        results = preset_results(spec, index, version)
+        if results is not None:
+            selection = AggregatesSelection(selection, lambda: results)
+        selection = MemoizedSelection(selection, spec, version)
+    # Estimates from the sample while the filters are being changed
+    return preview(spec, selection)
+
+
+def cases(spec, columns=None):
+    # The cases matching a filter spec, without widgets
+    spec = canonical(spec)
+    if BACKEND in ("sqlite", "service"):
+        store = _store()
+        return StoreSelection(store, spec, columns or store.columns)
+    # Positions from the shared index, the frame itself is not copied
+    index = load_index()
+    return FrameSelection(load_data(columns=columns),
+                          index.rows(index.select(spec)))
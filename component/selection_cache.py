@@ -0,0 +1,57 @@
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+# Default budget for the compressed selections of one dataset version
+DEFAULT_BUDGET_MB = int(os.environ.get("DASHBOARD_SELECTION_CACHE_MB", 256))
+
+
+class SelectionCache:
+    # Filter spec -> row bitmap, shared by every session. Bitmaps are stored
+    # zlib compressed and the least recently used ones are dropped once the
+    # stored bytes exceed the budget.
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, spec):
+        with self._lock:
+            entry = self._entries.get(spec)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(spec)
+            self.hits += 1
+        data, size = entry
+        return np.frombuffer(zlib.decompress(data), dtype=np.uint8,
+                             count=size).copy()
+
+    def put(self, spec, bitmap):
+        data = zlib.compress(bitmap.tobytes(), 1)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(spec, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._entries[spec] = (data, len(bitmap))
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import json
+import os
+from collections import OrderedDict
+
+import pandas as pd
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from component.analysis import age_group_counts, value_counts, yes_counts
+from component.arrow_store import is_current, read_arrow
+from component.comorbidity import COLUMNS as COMORBIDITY_COLUMNS
+from component.comorbidity import comorbidity
+from component.cube import SOURCE_COLUMNS, build_cube
+from component.filter_index import FilterIndex
+from component.filter_spec import OPS, spec_from_json
+from component.loader import DATE_COLUMNS, data_source, plain_frame, read_data
+from component.selection_cache import SelectionCache
+from component.summary import distinct_counts
+from component.table import PAGE_SIZES, sorted_page
+
+# One process holding the dataset and answering the page queries over HTTP,
+# with the filter semantics of component.filter:
+#
+#   python -m component.service --port 8000
+#
+# App processes started with DASHBOARD_BACKEND=service query it through
+# component.service_client instead of loading the data themselves. Every
+# endpoint takes {"spec": [[column, op, value], ...]} plus its own fields.
+# The data is read once at startup; restart the service after an ingest.
+
+# Budget for the finished responses kept for repeated requests, measured
+# as their JSON size
+CACHE_MB = int(os.environ.get("DASHBOARD_SERVICE_CACHE_MB", 256))
+
+app = FastAPI(title="COVID-19 dashboard aggregations")
+
+
+class FrameStore:
+    # sql_store.Store's queries answered from the frame in memory
+
+    def __init__(self, df):
+        self.df = df
+        self.index = FilterIndex(df, cache=SelectionCache())
+        self.columns = list(df.columns)
+        self.integer_columns = [
+            column for column in df.columns
+            if column != "AGE" and pd.api.types.is_integer_dtype(df[column])]
+
+    def selected(self, spec, column):
+        return self.df[column].iloc[self.index.rows(self.index.select(spec))]
+
+    def count(self, spec):
+        return self.index.count(self.index.select(spec))
+
+    def min(self, column, spec):
+        return self.index.min(column, self.index.select(spec))
+
+    def max(self, column, spec):
+        return self.index.max(column, self.index.select(spec))
+
+    def facet_counts(self, columns, spec):
+        return self.index.facet_counts(columns, self.index.select(spec))
+
+    def rows(self, spec, columns, sort_by=None, descending=False, start=0,
+             stop=None):
+        rows = self.df[columns].iloc[self.index.rows(self.index.select(spec))]
+        return sorted_page(rows, sort_by, descending, start, stop)
+
+
+class Query(BaseModel):
+    spec: list = []
+    column: str = None
+    columns: list = None
+    sort_by: str = None
+    descending: bool = False
+    start: int = 0
+    stop: int = None
+
+
+class Coalescer:
+    # Identical requests in flight share one computation, run in the thread
+    # pool; finished responses are kept, least recently used dropped first
+    # once they hold more than `max_bytes`. Only touched from the event
+    # loop, so no locking.
+
+    def __init__(self, max_bytes=CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.responses = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    async def get(self, key, fn, *args, keep=True):
+        if key in self.responses:
+            self.responses.move_to_end(key)
+            self.hits += 1
+            return self.responses[key][0]
+        task = self.pending.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(
+                run_in_threadpool(self._sized, fn, args, keep))
+            self.pending[key] = task
+            task.add_done_callback(lambda task: self._done(key, task, keep))
+        else:
+            self.coalesced += 1
+        # One client going away must not cancel the others' computation
+        return (await asyncio.shield(task))[0]
+
+    def _sized(self, fn, args, keep):
+        # The response with its size, measured in the thread pool as well
+        result = fn(*args)
+        return result, len(json.dumps(result, default=str)) if keep else 0
+
+    def _done(self, key, task, keep):
+        del self.pending[key]
+        if not keep or task.cancelled() or task.exception() is not None:
+            return
+        result, size = task.result()
+        if size > self.max_bytes:
+            return
+        self.responses[key] = result, size
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self.responses.popitem(last=False)
+            self.bytes -= evicted
+
+    def stats(self):
+        return {"entries": len(self.responses), "bytes": self.bytes,
+                "max_bytes": self.max_bytes, "pending": len(self.pending),
+                "hits": self.hits, "coalesced": self.coalesced,
+                "misses": self.misses}
+
+
+store = None
+responses = Coalescer()
+
+
+def load(source=None):
+    # Mapped from component.arrow_store's file when it is current
+    global store
+    source = source or data_source()
+    df = read_arrow() if is_current(source) else read_data(source)
+    store = FrameStore(df)
+
+
+def _value(column, value):
+    # min/max as JSON: ISO dates, None when nothing is selected
+    if pd.isna(value):
+        return None
+    if column in DATE_COLUMNS:
+        return value.strftime("%Y-%m-%d")
+    return value.item() if hasattr(value, "item") else value
+
+
+def _check_column(column):
+    if column not in store.columns:
+        raise HTTPException(400, f"Unknown column: {column}")
+
+
+def _spec(query):
+    # The query's spec, or a 400 for one the filters cannot answer, before it
+    # is computed or shared with other requests
+    try:
+        spec = spec_from_json(query.spec)
+    except (TypeError, ValueError, IndexError) as e:
+        raise HTTPException(400, f"Malformed filter spec: {e}")
+    for column, op, value in spec:
+        _check_column(column)
+        if op not in OPS:
+            raise HTTPException(400, f"Unknown filter operator: {op}")
+        if op == "between" and len(value) != 2:
+            raise HTTPException(400, f"{column}: between takes two bounds")
+    for column in [query.column, query.sort_by] + (query.columns or []):
+        if column is not None:
+            _check_column(column)
+    return spec
+
+
+async def answer(endpoint, query, fn, keep=True):
+    spec = _spec(query)
+    key = json.dumps([endpoint, spec, query.dict(exclude={"spec"})],
+                     default=str)
+    return await responses.get(key, fn, spec, query, keep=keep)
+
+
+@app.on_event("startup")
+def startup():
+    if store is None:
+        load(os.environ.get("DASHBOARD_SERVICE_SOURCE") or data_source())
+
+
+@app.get("/columns")
+async def columns():
+    return {"columns": store.columns, "integer_columns": store.integer_columns}
+
+
+@app.get("/stats")
+async def stats():
+    return {"rows": len(store.df), "responses": responses.stats(),
+            "selections": store.index.cache.stats()}
+
+
+@app.post("/count")
+async def count(query: Query):
+    return await answer("count", query,
+                        lambda spec, query: store.count(spec))
+
+
+@app.post("/min")
+async def minimum(query: Query):
+    return await answer("min", query, lambda spec, query: _value(
+        query.column, store.min(query.column, spec)))
+
+
+@app.post("/max")
+async def maximum(query: Query):
+    return await answer("max", query, lambda spec, query: _value(
+        query.column, store.max(query.column, spec)))
+
+
+@app.post("/facet_counts")
+async def facet_counts(query: Query):
+    # Rows per value of each column, for the filter widgets
+    return await answer("facet_counts", query, lambda spec, query:
+                        store.facet_counts(query.columns, spec))
+
+
+def _overview(spec, query):
+    def counts(column):
+        return value_counts(store.selected(spec, column)).to_dict()
+
+    return {"rows": store.count(spec), "sex": counts("SEX"),
+            "hospitalized": counts("HOSPITALIZED"),
+            "outcome": counts("OUTCOME")}
+
+
+@app.post("/overview")
+async def overview(query: Query):
+    # The Home metrics for a selection
+    return await answer("overview", query, _overview)
+
+
+@app.post("/age_groups")
+async def age_groups(query: Query):
+    return await answer("age_groups", query, lambda spec, query: (
+        age_group_counts(store.selected(spec, "AGE")).tolist()))
+
+
+@app.post("/distinct_counts")
+async def distinct(query: Query):
+    # Histogram input: every distinct value with its number of rows
+    def fn(spec, query):
+        values, counts = distinct_counts(
+            store.selected(spec, query.column).to_numpy())
+        return {"values": values.tolist(), "counts": counts.tolist()}
+
+    return await answer("distinct_counts", query, fn)
+
+
+@app.post("/value_counts")
+async def value_count(query: Query):
+    def fn(spec, query):
+        counts = value_counts(store.selected(spec, query.column))
+        return {"labels": counts.index.tolist(),
+                "counts": counts.tolist()}
+
+    return await answer("value_counts", query, fn)
+
+
+@app.post("/yes_counts")
+async def yes_count(query: Query):
+    # YES per column, e.g. the comorbidities of ICU or deceased cases
+    def fn(spec, query):
+        rows = store.index.rows(store.index.select(spec))
+        return yes_counts(store.df[query.columns].iloc[rows],
+                          query.columns).to_dict()
+
+    return await answer("yes_counts", query, fn)
+
+
+@app.post("/comorbidity")
+async def comorbidities(query: Query):
+    # Non-empty cells of the comorbidity table
+    def fn(spec, query):
+        rows = store.index.rows(store.index.select(spec))
+        keys, counts = comorbidity(
+            store.df[COMORBIDITY_COLUMNS].iloc[rows]).keys()
+        return {"keys": keys.tolist(), "counts": counts.tolist()}
+
+    return await answer("comorbidity", query, fn)
+
+
+@app.post("/rows")
+async def rows(query: Query):
+    def fn(spec, query):
+        page = store.rows(spec, query.columns or store.columns, query.sort_by,
+                          query.descending, query.start, query.stop)
+        return {"columns": list(page.columns),
+                "data": plain_frame(page).values.tolist()}
+
+    # Pages of the data table are kept, longer reads (exports) are not
+    page = (query.stop is not None
+            and query.stop - query.start <= max(PAGE_SIZES))
+    return await answer("rows", query, fn, keep=page)
+
+
+@app.get("/cube")
+async def cube():
+    def fn(spec, query):
+        cube = build_cube(store.df[SOURCE_COLUMNS])
+        return {"columns": list(cube.columns),
+                "data": plain_frame(cube).values.tolist()}
+
+    return await answer("cube", Query(), fn)
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(
+        description="Serve the dashboard aggregations over HTTP.")
+    parser.add_argument("--source", help="CSV file or Parquet dataset "
+                                         "(default: the app's data source)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    load(args.source)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
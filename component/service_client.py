@@ -0,0 +1,145 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+from component.analysis import AGE_LABELS
+from component.comorbidity import Comorbidity
+from component.cube import tidy_cube
+from component.loader import DATE_COLUMNS, convert_dtypes
+from component.profiling import profiled
+
+# sql_store.Store's interface over HTTP to component.service, so the filter
+# widgets, StoreSelection and store_table() work the same against it. Used
+# with DASHBOARD_BACKEND=service.
+
+SERVICE_URL = os.environ.get("DASHBOARD_SERVICE_URL", "http://127.0.0.1:8000")
+
+# Keep-alive connections shared by every session of an app process
+POOL_SIZE = int(os.environ.get("DASHBOARD_SERVICE_POOL", 16))
+
+TIMEOUT = 60
+
+
+class ServiceClient:
+
+    def __init__(self, url=SERVICE_URL, pool_size=POOL_SIZE):
+        self.url = url.rstrip("/")
+        self._local = threading.local()
+        # Sessions wait for a free connection instead of opening more
+        self.adapter = HTTPAdapter(pool_connections=1,
+                                   pool_maxsize=pool_size, pool_block=True)
+        info = self._get("columns")
+        self.columns = info["columns"]
+        self.integer_columns = info["integer_columns"]
+
+    def session(self):
+        # requests.Session is not thread-safe and Streamlit runs sessions in
+        # threads, so each thread gets its own, all on the one shared pool
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+            self._local.session = session
+        return session
+
+    def _get(self, endpoint):
+        response = self.session().get(f"{self.url}/{endpoint}",
+                                      timeout=TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def _post(self, endpoint, spec, **fields):
+        response = self.session().post(f"{self.url}/{endpoint}",
+                                       json=dict(fields, spec=spec),
+                                       timeout=TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    # FilterIndex interface used by filter_spec()
+
+    def select(self, spec):
+        return spec
+
+    def min(self, column, spec):
+        return self._value(column, self._post("min", spec, column=column))
+
+    def max(self, column, spec):
+        return self._value(column, self._post("max", spec, column=column))
+
+    def _value(self, column, value):
+        if column in DATE_COLUMNS:
+            return pd.NaT if value is None else pd.Timestamp(value)
+        return np.nan if value is None else value
+
+    def facet_counts(self, columns, spec):
+        return self._post("facet_counts", spec, columns=list(columns))
+
+    # Page aggregations, same results as sql_store.Store
+
+    @profiled
+    def count(self, spec):
+        return self._post("count", spec)
+
+    @profiled
+    def age_group_counts(self, spec):
+        index = pd.CategoricalIndex(AGE_LABELS, categories=AGE_LABELS,
+                                    ordered=True, name="AGE_BIN")
+        return pd.Series(self._post("age_groups", spec), index=index,
+                         name="count")
+
+    @profiled
+    def distinct_counts(self, spec, column="AGE"):
+        result = self._post("distinct_counts", spec, column=column)
+        return (np.array(result["values"]),
+                np.array(result["counts"], dtype=np.int64))
+
+    @profiled
+    def value_counts(self, spec, column):
+        result = self._post("value_counts", spec, column=column)
+        return pd.Series(result["counts"],
+                         index=pd.CategoricalIndex(result["labels"],
+                                                   name=column),
+                         name="count")
+
+    @profiled
+    def yes_counts(self, spec, columns):
+        counts = self._post("yes_counts", spec, columns=list(columns))
+        return pd.Series(counts, index=columns, dtype="int64")
+
+    @profiled
+    def comorbidity(self, spec):
+        result = self._post("comorbidity", spec)
+        return Comorbidity.from_keys(result["keys"], result["counts"])
+
+    @profiled
+    def overview(self, spec):
+        return self._post("overview", spec)
+
+    @profiled
+    def cube(self):
+        result = self._get("cube")
+        return tidy_cube(pd.DataFrame(result["data"],
+                                      columns=result["columns"]))
+
+    # Rows for the data table
+
+    def rows(self, spec, columns, sort_by=None, descending=False, start=0,
+             stop=None):
+        result = self._post("rows", spec, columns=list(columns),
+                            sort_by=sort_by, descending=descending,
+                            start=start, stop=stop)
+        df = pd.DataFrame(result["data"], columns=result["columns"])
+        return convert_dtypes(df.astype(
+            {c: "Int64" for c in self.integer_columns if c in df.columns}))
+
+
+@st.cache_resource(show_spinner="Connecting to the service...")
+def load_client(url=SERVICE_URL):
+    # One client, and so one connection pool, per app process
+    return ServiceClient(url)
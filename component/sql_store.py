@@ -0,0 +1,338 @@
+import argparse
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from component.analysis import AGE_BINS, AGE_LABELS, DISEASE_COLUMNS
+from component.comorbidity import OUTCOMES, Comorbidity
+from component.cube import DIMENSIONS, YEAR_MONTH_COLUMNS, tidy_cube
+from component.filter import FILTER_COLUMNS
+from component.loader import (DATE_COLUMNS, SHARED_DICTIONARY_COLUMNS,
+                              convert_dtypes, file_signature, plain_frame,
+                              read_chunks, read_columns)
+from component.profiling import profiled
+from component.reverse_mapping import codebook
+
+# The mapped dataset in an on-disk SQLite file, so filtering and the page
+# aggregations run inside the engine and several app processes can share one
+# copy. Labels are stored as text, dates as ISO text (which sorts like the
+# dates) and AGE as an integer. Selected with DASHBOARD_BACKEND=sqlite.
+
+STORE_PATH = os.path.join("assets", "mapped_data.sqlite")
+
+TABLE = "cases"
+
+INSERT_ROWS = 100_000
+
+
+def quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def where_clause(spec):
+    # A canonical filter spec as one parameterized condition, with the same
+    # semantics as FilterIndex.select()
+    terms, params = [], []
+    for column, op, value in spec:
+        name = quote(column)
+        if op == "==":
+            terms.append(f"{name} = ?")
+            params.append(value)
+        elif op == "in":
+            terms.append(f"{name} IN ({', '.join('?' * len(value))})"
+                         if value else "0")
+            params.extend(value)
+        elif op == "between":
+            if value[0] is None or value[1] is None:
+                terms.append("0")
+            else:
+                # Unary + keeps the planner off an index for the range: the
+                # page ranges default to everything, and without STAT4
+                # sqlite cannot tell how much of the table they cover
+                terms.append(f"+{name} BETWEEN ? AND ?")
+                params.extend(value)
+        elif op == "isnull":
+            terms.append(f"{name} IS NULL")
+        elif op == "notnull":
+            terms.append(f"{name} IS NOT NULL")
+        else:
+            raise ValueError(f"Unknown filter operator: {op}")
+    return " AND ".join(terms) or "1", params
+
+
+def _sql_type(column, series):
+    if column == "AGE" or pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+def _order_by(column):
+    # Sort order of the loaded categoricals: codebook order for coded
+    # columns, label text for the shared dictionary ones
+    mapping = codebook(column)
+    if mapping is None or column in SHARED_DICTIONARY_COLUMNS:
+        return quote(column)
+    labels = sorted(mapping, key=mapping.get)
+    cases = " ".join(f"WHEN '{label}' THEN {i}"
+                     for i, label in enumerate(labels))
+    return f"CASE {quote(column)} {cases} ELSE {len(labels)} END"
+
+
+def build_store(source=None, output=STORE_PATH):
+    columns = read_columns(source)
+    tmp = output + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    connection = sqlite3.connect(tmp)
+    insert = (f"INSERT INTO {TABLE} VALUES ("
+              + ", ".join("?" * len(columns)) + ")")
+    rows = 0
+    for chunk in read_chunks(source, columns, INSERT_ROWS):
+        if not rows:
+            # Column types from the first chunk's dtypes
+            connection.execute(
+                f"CREATE TABLE {TABLE} ("
+                + ", ".join(f"{quote(c)} {_sql_type(c, chunk[c])}"
+                            for c in columns) + ")")
+        connection.executemany(
+            insert, plain_frame(chunk[columns]).itertuples(index=False,
+                                                          name=None))
+        rows += len(chunk)
+
+    # Equality and IN predicates only; ranges are evaluated during the scan
+    for column in FILTER_COLUMNS:
+        if column in columns and column != "AGE" and column not in DATE_COLUMNS:
+            connection.execute(
+                f"CREATE INDEX {quote('idx_' + column)} "
+                f"ON {TABLE} ({quote(column)})")
+    # Row counts per index let the planner skip the unselective ones
+    connection.execute("ANALYZE")
+    connection.commit()
+    connection.close()
+    os.replace(tmp, output)
+    return rows
+
+
+class Store:
+    # Read-only queries against the store. Also stands in for FilterIndex in
+    # filter_spec(): a "selection" is just the spec, evaluated in SQL.
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        info = self.query(f"PRAGMA table_info({TABLE})")
+        self.columns = [row[1] for row in info]
+        # Read back as nullable integers, like the loaded data
+        self.integer_columns = [row[1] for row in info
+                                if row[2] == "INTEGER" and row[1] != "AGE"]
+        # Every value of a column, read once by facet_counts()
+        self.distinct = {}
+
+    def connection(self):
+        # Streamlit runs sessions in threads; each gets its own connection
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro",
+                                         uri=True)
+            self._local.connection = connection
+        return connection
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    # FilterIndex interface used by filter_spec()
+
+    def select(self, spec):
+        return spec
+
+    def min(self, column, spec):
+        return self._extreme("MIN", column, spec)
+
+    def max(self, column, spec):
+        return self._extreme("MAX", column, spec)
+
+    def _extreme(self, fn, column, spec):
+        where, params = where_clause(spec)
+        value = self.query(f"SELECT {fn}({quote(column)}) FROM {TABLE} "
+                           f"WHERE {where}", params)[0][0]
+        if column in DATE_COLUMNS:
+            return pd.NaT if value is None else pd.Timestamp(value)
+        return np.nan if value is None else value
+
+    def facet_counts(self, columns, spec):
+        # Same as FilterIndex.facet_counts(), every value of every column
+        # counted in one scan of the selected rows
+        cells, terms, params = [], [], []
+        for column in columns:
+            for value in self._distinct(column):
+                cells.append((column, value))
+                terms.append(f"COALESCE(SUM({quote(column)} = ?), 0)")
+                params.append(value)
+        counts = {column: {} for column in columns}
+        if not terms:
+            return counts
+        where, values = where_clause(spec)
+        row = self.query(f"SELECT {', '.join(terms)} FROM {TABLE} "
+                         f"WHERE {where}", params + values)[0]
+        for (column, value), count in zip(cells, row):
+            if count:
+                counts[column][value] = count
+        return counts
+
+    def _distinct(self, column):
+        if column not in self.distinct:
+            name = quote(column)
+            self.distinct[column] = [row[0] for row in self.query(
+                f"SELECT DISTINCT {name} FROM {TABLE} "
+                f"WHERE {name} IS NOT NULL ORDER BY {name}")]
+        return self.distinct[column]
+
+    # Page aggregations, computed with GROUP BY in the engine
+
+    @profiled
+    def count(self, spec):
+        where, params = where_clause(spec)
+        return self.query(f"SELECT COUNT(*) FROM {TABLE} WHERE {where}",
+                          params)[0][0]
+
+    @profiled
+    def age_group_counts(self, spec):
+        # Same as analysis.age_group_counts() on the selected rows
+        where, params = where_clause(spec)
+        rows = dict(self.query(
+            f"SELECT AGE / 10, COUNT(*) FROM {TABLE} WHERE {where} "
+            f"AND AGE >= ? AND AGE < ? GROUP BY AGE / 10",
+            params + [AGE_BINS[0], AGE_BINS[-1]]))
+        index = pd.CategoricalIndex(AGE_LABELS, categories=AGE_LABELS,
+                                    ordered=True, name="AGE_BIN")
+        return pd.Series([rows.get(i, 0) for i in range(len(AGE_LABELS))],
+                         index=index, name="count")
+
+    @profiled
+    def distinct_counts(self, spec, column="AGE"):
+        # Same as summary.distinct_counts() on the selected rows
+        where, params = where_clause(spec)
+        name = quote(column)
+        rows = self.query(
+            f"SELECT {name}, COUNT(*) FROM {TABLE} WHERE {where} "
+            f"AND {name} IS NOT NULL GROUP BY {name} ORDER BY {name}", params)
+        return (np.array([row[0] for row in rows]),
+                np.array([row[1] for row in rows], dtype=np.int64))
+
+    @profiled
+    def value_counts(self, spec, column):
+        # Same as analysis.value_counts() on the selected rows
+        where, params = where_clause(spec)
+        name = quote(column)
+        rows = self.query(
+            f"SELECT {name}, COUNT(*) FROM {TABLE} WHERE {where} "
+            f"AND {name} IS NOT NULL GROUP BY {name} "
+            f"ORDER BY {_order_by(column)}, {name}", params)
+        index = pd.CategoricalIndex([row[0] for row in rows], name=column)
+        counts = pd.Series([row[1] for row in rows], index=index,
+                           name="count")
+        return counts.sort_values(ascending=False, kind="stable")
+
+    @profiled
+    def yes_counts(self, spec, columns):
+        # Same as analysis.yes_counts() on the selected rows
+        where, params = where_clause(spec)
+        sums = ", ".join(f"COALESCE(SUM({quote(c)} = 'YES'), 0)"
+                         for c in columns)
+        counts = self.query(f"SELECT {sums} FROM {TABLE} WHERE {where}",
+                            params)[0]
+        return pd.Series(counts, index=columns, dtype="int64")
+
+    @profiled
+    def comorbidity(self, spec):
+        # Same as comorbidity.comorbidity() on the selected rows, the packed
+        # keys grouped in the engine. A missing flag is not a YES.
+        bits, params = [], []
+        for i, column in enumerate(DISEASE_COLUMNS):
+            bits.append(f"(COALESCE({quote(column)} = 'YES', 0) << {i})")
+        for i, outcome in enumerate(OUTCOMES.values()):
+            condition, values = where_clause(outcome)
+            bits.append(f"(COALESCE({condition}, 0) "
+                        f"<< {len(DISEASE_COLUMNS) + i})")
+            params.extend(values)
+        where, values = where_clause(spec)
+        rows = self.query(
+            f"SELECT {' | '.join(bits)} AS mask, COUNT(*) FROM {TABLE} "
+            f"WHERE {where} GROUP BY mask", params + values)
+        return Comorbidity.from_keys([row[0] for row in rows],
+                                     [row[1] for row in rows])
+
+    @profiled
+    def cube(self):
+        # Same cells as cube.build_cube() over every row
+        keys = []
+        for dimension in DIMENSIONS:
+            column = YEAR_MONTH_COLUMNS.get(dimension)
+            if column is None:
+                keys.append(f"{quote(dimension)} AS {quote(dimension)}")
+            else:
+                keys.append(
+                    f"COALESCE(CAST(substr({quote(column)}, 1, 4) || "
+                    f"substr({quote(column)}, 6, 2) AS INTEGER), 0) "
+                    f"AS {quote(dimension)}")
+        names = ", ".join(quote(d) for d in DIMENSIONS)
+        return tidy_cube(pd.read_sql_query(
+            f"SELECT {', '.join(keys)}, COUNT(*) AS COUNT FROM {TABLE} "
+            f"GROUP BY {names}", self.connection()))
+
+    # Rows for the data table
+
+    def rows(self, spec, columns, sort_by=None, descending=False, start=0,
+             stop=None):
+        where, params = where_clause(spec)
+        order = "rowid"
+        if sort_by is not None:
+            direction = "DESC" if descending else "ASC"
+            order = (f"{quote(sort_by)} IS NULL, {_order_by(sort_by)} "
+                     f"{direction}, rowid")
+        limit = ""
+        if stop is not None:
+            limit = " LIMIT ? OFFSET ?"
+            params = params + [max(stop - start, 0), start]
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(quote(c) for c in columns)} FROM {TABLE} "
+            f"WHERE {where} ORDER BY {order}{limit}", self.connection(),
+            params=params)
+        return convert_dtypes(df.astype(
+            {c: "Int64" for c in self.integer_columns if c in df.columns}))
+
+
+@st.cache_resource(show_spinner="Opening store...", max_entries=1)
+def _load_store(path, signature):
+    return Store(path)
+
+
+def load_store(path=STORE_PATH):
+    # One Store per file version, shared by every session of the process
+    return _load_store(path, file_signature(path))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load the mapped dataset into the SQLite store used "
+                    "with DASHBOARD_BACKEND=sqlite.")
+    parser.add_argument("source", nargs="?",
+                        help="CSV file or Parquet dataset "
+                             "(default: the app's data source)")
+    parser.add_argument("--output", default=STORE_PATH,
+                        help="store file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    rows = build_store(args.source, args.output)
+    print(f"Wrote {rows:,} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
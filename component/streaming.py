@@ -0,0 +1,171 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from component.analysis import AGE_LABELS, age_group_counts
+from component.comorbidity import COLUMNS as COMORBIDITY_COLUMNS
+from component.comorbidity import Comorbidity
+from component.cube import SOURCE_COLUMNS, build_cube, merge_cubes
+from component.filter import FILTER_COLUMNS
+from component.filter_spec import canonical, spec_from_json, spec_mask
+from component.loader import codebook_dtype, read_chunks
+from component.summary import distinct_counts
+
+# The page aggregations computed chunk by chunk, for data that does not fit
+# in memory. Each chunk is filtered with the same spec semantics as
+# component.filter and folded into running totals, so memory depends on the
+# chunk size and not on the number of rows.
+
+COLUMNS = list(dict.fromkeys(FILTER_COLUMNS + COMORBIDITY_COLUMNS
+                             + SOURCE_COLUMNS))
+
+CHUNK_ROWS = 128 * 1024
+
+
+class Aggregates:
+    # Running totals over the selected rows of every chunk seen so far. Two
+    # instances over disjoint rows merge into the totals over both. The Home
+    # cube is left out with cube=False.
+
+    def __init__(self, cube=True):
+        self.rows = 0
+        self.age_groups = pd.Series(0, index=pd.CategoricalIndex(
+            AGE_LABELS, categories=AGE_LABELS, ordered=True, name="AGE_BIN"),
+            name="count")
+        self.ages = pd.Series(dtype="int64")
+        self.intubated = {}
+        self.comorbidity = Comorbidity()
+        self.cube = None
+        self.with_cube = cube
+
+    def add(self, df):
+        self.rows += len(df)
+        self.age_groups += age_group_counts(df["AGE"])
+        values, counts = distinct_counts(df["AGE"].to_numpy())
+        self.ages = self.ages.add(pd.Series(counts, index=values),
+                                  fill_value=0).astype("int64")
+
+        codes = df["INTUBATED"].cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0],
+                             minlength=len(df["INTUBATED"].cat.categories))
+        for label, count in zip(df["INTUBATED"].cat.categories, counts):
+            self.intubated[label] = self.intubated.get(label, 0) + int(count)
+
+        self.comorbidity.add(df)
+
+        if not self.with_cube:
+            return self
+        cube = build_cube(df[SOURCE_COLUMNS])
+        self.cube = cube if self.cube is None else merge_cubes(self.cube, cube)
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.age_groups += other.age_groups
+        self.ages = self.ages.add(other.ages, fill_value=0).astype("int64")
+        for label, count in other.intubated.items():
+            self.intubated[label] = self.intubated.get(label, 0) + count
+        self.comorbidity.merge(other.comorbidity)
+        if other.cube is not None:
+            self.cube = (other.cube if self.cube is None
+                         else merge_cubes(self.cube, other.cube))
+        return self
+
+    def intubated_counts(self):
+        # Same as analysis.value_counts(df["INTUBATED"]) over all the rows
+        labels = pd.Series(list(self.intubated), dtype=object)
+        order = codebook_dtype("INTUBATED", labels).categories
+        counts = pd.Series([self.intubated.get(label, 0) for label in order],
+                           index=pd.CategoricalIndex(order, categories=order,
+                                                     name="INTUBATED"),
+                           name="count")
+        return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+    def age_counts(self):
+        # Same as summary.distinct_counts(df["AGE"]) over all the rows
+        ages = self.ages[self.ages > 0].sort_index()
+        return ages.index.to_numpy(), ages.to_numpy()
+
+    def results(self):
+        return {"rows": self.rows,
+                "age_groups": self.age_groups,
+                "ages": self.age_counts(),
+                "intubated": self.intubated_counts(),
+                "comorbidity": self.comorbidity,
+                "cube": self.cube}
+
+
+def results_to_json(results):
+    # Aggregates.results() as plain JSON values, without the cube
+    values, counts = results["ages"]
+    return {"rows": int(results["rows"]),
+            "age_groups": results["age_groups"].to_dict(),
+            "ages": {"values": values.tolist(), "counts": counts.tolist()},
+            "intubated": results["intubated"].to_dict(),
+            "comorbidity": dict(zip(*(values.tolist() for values in
+                                      results["comorbidity"].keys())))}
+
+
+def results_from_json(data):
+    # Back to the types of Aggregates.results(), in the same order
+    index = pd.CategoricalIndex(AGE_LABELS, categories=AGE_LABELS,
+                                ordered=True, name="AGE_BIN")
+    labels = pd.Series(list(data["intubated"]), dtype=object)
+    order = codebook_dtype("INTUBATED", labels).categories
+    return {"rows": data["rows"],
+            "age_groups": pd.Series([data["age_groups"][label]
+                                     for label in AGE_LABELS],
+                                    index=index, name="count"),
+            "ages": (np.array(data["ages"]["values"]),
+                     np.array(data["ages"]["counts"], dtype=np.int64)),
+            "intubated": pd.Series(
+                list(data["intubated"].values()),
+                index=pd.CategoricalIndex(labels, categories=order,
+                                          name="INTUBATED"),
+                name="count"),
+            "comorbidity": Comorbidity.from_keys(
+                [int(key) for key in data["comorbidity"]],
+                list(data["comorbidity"].values())),
+            "cube": None}
+
+
+def aggregate_chunks(chunks, spec=(), cube=True):
+    totals = Aggregates(cube)
+    for chunk in chunks:
+        selected = chunk[spec_mask(chunk, spec)] if spec else chunk
+        if len(selected):
+            totals.add(selected)
+    return totals
+
+
+def aggregate(spec=(), path=None, chunk_rows=CHUNK_ROWS):
+    # One pass over the data source for every page aggregation of `spec`
+    return aggregate_chunks(read_chunks(path, COLUMNS, chunk_rows),
+                            canonical(spec))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute the page aggregations for a filter spec in "
+                    "bounded memory.")
+    parser.add_argument("--source", help="CSV file or Parquet dataset "
+                                         "(default: the app's data source)")
+    parser.add_argument("--spec", default="[]",
+                        help='JSON list of [column, op, value] predicates, '
+                             'e.g. \'[["SEX", "in", ["FEMALE"]]]\'')
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    spec = spec_from_json(json.loads(args.spec))
+    results = aggregate(spec, args.source, args.chunk_rows).results()
+
+    print(json.dumps(dict(
+        results_to_json(results),
+        cube_cells=0 if results["cube"] is None else len(results["cube"])),
+        indent=2))
+
+
+if __name__ == "__main__":
+    main()
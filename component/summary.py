@@ -0,0 +1,154 @@
+import math
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from component.profiling import profiled
+
+# Box and histogram statistics computed on the server from (value, count)
+# pairs, so a figure carries a handful of numbers per box or bin instead of
+# one point per case. The rules follow plotly.js, which is what drew these
+# charts from the raw rows before.
+
+MAX_OUTLIERS = 1000
+
+
+@profiled
+def distinct_counts(values):
+    # Sorted distinct values and how often each occurs, NaN dropped
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.integer) and len(values):
+        low = int(values.min())
+        counts = np.bincount((values - low).astype(np.intp))
+        present = np.flatnonzero(counts)
+        return present + low, counts[present]
+    values = values[~np.isnan(values)]
+    return np.unique(values, return_counts=True)
+
+
+def quantile(values, counts, q):
+    # plotly.js "linear" quartile method: position q * n - 0.5 in the sorted
+    # sample, clamped to its ends and interpolated between neighbours
+    n = int(counts.sum())
+    position = min(max(q * n - 0.5, 0), n - 1)
+    ends = np.cumsum(counts)
+    low = values[np.searchsorted(ends, math.floor(position), side="right")]
+    high = values[np.searchsorted(ends, math.ceil(position), side="right")]
+    return low + (position % 1) * (high - low)
+
+
+def box_summary(values, counts):
+    keep = counts > 0
+    values, counts = values[keep], counts[keep]
+    q1 = quantile(values, counts, 0.25)
+    median = quantile(values, counts, 0.5)
+    q3 = quantile(values, counts, 0.75)
+
+    # Whiskers reach the furthest values within 1.5 IQR of the box
+    iqr = q3 - q1
+    inside = (values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)
+    outliers = values[~inside]
+    if len(outliers) > MAX_OUTLIERS:
+        step = len(outliers) / MAX_OUTLIERS
+        outliers = outliers[(np.arange(MAX_OUTLIERS) * step).astype(np.intp)]
+
+    return {"q1": q1, "median": median, "q3": q3,
+            "lowerfence": values[inside].min(),
+            "upperfence": values[inside].max(),
+            "outliers": outliers}
+
+
+@profiled
+def grouped_box_summaries(counts):
+    # One box_summary() per first index level of a (group, value) -> count
+    # Series, such as cube totals by [group, "AGE"]
+    return {group: box_summary(part.index.get_level_values(-1).to_numpy(),
+                               part.to_numpy())
+            for group, part in counts.groupby(level=0, observed=True)
+            if part.sum() > 0}
+
+
+def _nice_size(rough):
+    # Smallest of 2, 5 or 10 times a power of ten that is >= rough, the
+    # rounding plotly.js applies to automatic bin sizes
+    base = 10 ** math.floor(math.log10(rough))
+    for step in (2, 5, 10):
+        if rough / base <= step:
+            return step * base
+    return 10 * base
+
+
+def histogram_bins(values, counts, nbins):
+    # Bin edges chosen like plotly.js autobinning with `nbins` bins
+    if not len(values):
+        return {"start": 0, "end": 1, "size": 1,
+                "counts": np.zeros(0, dtype=np.int64)}
+    low, high = values.min(), values.max()
+    size = _nice_size((high - low) / nbins) if high > low else 1
+    start = math.ceil(low / size) * size - size
+
+    integers = np.all(np.mod(values, 1) == 0)
+    if integers:
+        # Integer data is moved off the bin edges
+        start -= 0.5
+        if start + size < low:
+            start += size
+    else:
+        def near_edge(v):
+            return (1 + (v - start) * 100 / size) % 100 < 2
+
+        total = counts.sum()
+        edge = counts[near_edge(values)].sum()
+        middle = counts[near_edge(values + size / 2)].sum()
+        if middle < total * 0.1 and (edge > total * 0.3 or near_edge(low)
+                                     or near_edge(high)):
+            start += size / 2 if start + size / 2 < low else -size / 2
+
+    bins = int((high - start) // size) + 1
+    which = ((values - start) // size).astype(np.intp)
+    bin_counts = np.bincount(which, weights=counts, minlength=bins)
+    return {"start": start, "end": start + bins * size, "size": size,
+            "counts": bin_counts.astype(np.int64)}
+
+
+@profiled
+def histogram_figure(values, counts, x, nbins, labels=None, **kwargs):
+    # Same look as px.histogram(df, x=x, nbins=nbins), drawn from bin totals
+    bins = histogram_bins(values, counts, nbins)
+    centers = bins["start"] + bins["size"] * (np.arange(len(bins["counts"])) + 0.5)
+    frame = pd.DataFrame({x: centers, "count": bins["counts"]})
+
+    fig = px.histogram(frame, x=x, y="count", labels=labels, **kwargs)
+    fig.update_traces(
+        xbins={"start": bins["start"], "end": bins["end"],
+               "size": bins["size"]},
+        hovertemplate=f"{(labels or {}).get(x, x)}=%{{x}}<br>count=%{{y}}<extra></extra>")
+    fig.update_yaxes(title_text="count")
+    return fig
+
+
+@profiled
+def box_figure(summaries, x, y, **kwargs):
+    # Same look as px.box(df, x=x, y=y, color=x) from one box_summary() per
+    # category; outliers are drawn as markers on top of each box
+    frame = pd.DataFrame({x: list(summaries),
+                          y: [s["median"] for s in summaries.values()]})
+    fig = px.box(frame, x=x, y=y, color=x, **kwargs)
+
+    for trace in list(fig.data):
+        summary = summaries[trace.name]
+        trace.update(x=[trace.name], y=None, q1=[summary["q1"]],
+                     median=[summary["median"]], q3=[summary["q3"]],
+                     lowerfence=[summary["lowerfence"]],
+                     upperfence=[summary["upperfence"]],
+                     boxpoints=False, hovertemplate=None)
+        if len(summary["outliers"]):
+            fig.add_trace(go.Scatter(
+                x=[trace.name] * len(summary["outliers"]),
+                y=summary["outliers"], mode="markers",
+                marker={"color": trace.marker.color, "size": 6},
+                legendgroup=trace.legendgroup, showlegend=False,
+                hovertemplate=f"{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>"))
+    return fig
@@ -0,0 +1,198 @@
+import gzip
+import math
+import os
+import shutil
+import time
+import uuid
+
+import streamlit as st
+
+from component.profiling import profiled
+
+PAGE_SIZES = [25, 50, 100, 500]
+
+# Rows read and written at a time when exporting the whole selection
+EXPORT_CHUNK_ROWS = 100_000
+
+# Exports are written to files here, one directory each, and downloaded from
+# Streamlit's static file server (enabled in .streamlit/config.toml), so no
+# selection is held in memory as a whole. Removed after EXPORT_KEEP_SECONDS.
+EXPORT_DIR = os.path.join("static", "exports")
+EXPORT_URL = "app/static/exports"
+EXPORT_KEEP_SECONDS = 3600
+
+# Largest file Streamlit's static file server sends
+EXPORT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def sorted_positions(values, descending, start, stop):
+    # Positions in `values` of one page of them sorted
+    return (values.reset_index(drop=True)
+            .sort_values(ascending=not descending, kind="stable",
+                         na_position="last")
+            .index[start:stop])
+
+
+def sorted_page(df, sort_by, descending, start, stop):
+    if sort_by is None:
+        return df.iloc[start:stop]
+    # Only the sort column is ordered, then the page rows are taken
+    return df.iloc[sorted_positions(df[sort_by], descending, start, stop)]
+
+
+def export_chunks(page_rows, columns, sort_by, descending, total):
+    # The selection in table order, EXPORT_CHUNK_ROWS at a time; one empty
+    # chunk for an empty selection, so the file still has its columns
+    for start in range(0, max(total, 1), EXPORT_CHUNK_ROWS):
+        yield page_rows(columns, sort_by, descending, start,
+                        min(start + EXPORT_CHUNK_ROWS, total))
+
+
+def write_csv(chunks, path):
+    # gzip compressed, the header before the first chunk only
+    with gzip.open(path, "wb", compresslevel=6) as f:
+        for i, chunk in enumerate(chunks):
+            f.write(chunk.to_csv(index=False, header=i == 0).encode())
+
+
+def write_parquet(chunks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            schema = None if writer is None else writer.schema
+            table = pa.Table.from_pandas(chunk, schema=schema,
+                                         preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema,
+                                          compression="zstd")
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def remove_old_exports(directory=EXPORT_DIR, keep_seconds=EXPORT_KEEP_SECONDS):
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.stat(path).st_mtime < time.time() - keep_seconds:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@profiled
+def write_export(name, write, chunks, directory=EXPORT_DIR):
+    # The file `name` written by write(chunks, path) in a directory of its
+    # own; returns its path
+    remove_old_exports(directory)
+    path = os.path.join(directory, uuid.uuid4().hex, name)
+    os.makedirs(os.path.dirname(path))
+    write(chunks, path)
+    return path
+
+
+def _download_link(label, name, path):
+    size = os.path.getsize(path)
+    if size > EXPORT_MAX_BYTES:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        st.error(f"The {label} file is {size / 2**20:,.0f} MB, over the "
+                 f"{EXPORT_MAX_BYTES // 2**20} MB that can be downloaded. "
+                 f"Choose fewer rows or columns.")
+        return
+    url = "/".join([EXPORT_URL] + path.split(os.sep)[-2:])
+    st.markdown(f'<a href="{url}" download="{name}">Download {label}</a> '
+                f"({size / 2**20:,.1f} MB)", unsafe_allow_html=True)
+
+
+@profiled
+def paginated_table(df, key):
+    # Sorting, column selection and paging happen here; only the visible
+    # page is sent to the browser
+    _paginated(list(df.columns), len(df),
+               lambda columns, sort_by, descending, start, stop:
+               sorted_page(df, sort_by, descending, start, stop)[columns],
+               key)
+
+
+def whole_ages(df):
+    # AGE is loaded as a float when it has missing values; shown as whole
+    # years all the same
+    if ("AGE" in df.columns and df["AGE"].dtype.kind == "f"
+            and (df["AGE"].dropna() % 1 == 0).all()):
+        return df.astype({"AGE": "Int64"})
+    return df
+
+
+@profiled
+def rows_table(df, rows, key, transform=None):
+    # paginated_table() over the rows of `df` at positions `rows`; only the
+    # sort column, the visible page and exports are copied out of the frame
+    transform = transform or (lambda df: df)
+
+    def page_rows(columns, sort_by, descending, start, stop):
+        page = rows[start:stop]
+        if sort_by is not None:
+            page = rows[sorted_positions(df[sort_by].iloc[rows], descending,
+                                         start, stop)]
+        return whole_ages(transform(
+            df.iloc[page, df.columns.get_indexer(columns)]))
+
+    _paginated(list(df.columns), len(rows), page_rows, key)
+
+
+@profiled
+def store_table(store, spec, columns, key, transform=None):
+    # paginated_table() over the rows of `spec` in a sql_store.Store; only
+    # the visible page (or an export) is read from it
+    transform = transform or (lambda df: df)
+    _paginated(columns, store.count(spec),
+               lambda columns, sort_by, descending, start, stop: transform(
+                   store.rows(spec, columns, sort_by, descending, start,
+                              stop)), key)
+
+
+def _paginated(all_columns, total, page_rows, key):
+    columns = st.multiselect("Columns", all_columns, default=all_columns,
+                             key=f"{key}_columns")
+    columns = columns or all_columns
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sort_by = st.selectbox("Sort by", ["None"] + columns,
+                               key=f"{key}_sort_by")
+    with col2:
+        descending = st.selectbox("Order", ["Ascending", "Descending"],
+                                  key=f"{key}_order") == "Descending"
+    with col3:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES,
+                                 key=f"{key}_page_size")
+
+    pages = max(1, math.ceil(total / page_size))
+    with col4:
+        # Keyed by the page count so a smaller selection starts over at 1
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1,
+                               key=f"{key}_page_{pages}")
+
+    sort_by = None if sort_by == "None" else sort_by
+    start = (page - 1) * page_size
+    stop = min(start + page_size, total)
+    st.dataframe(page_rows(columns, sort_by, descending, start, stop))
+    st.caption(f"Rows {min(start + 1, total):,}-{stop:,} of {total:,}")
+
+    with st.expander("Export"):
+        # Every row of the selection in the table's order, written on
+        # request only and downloaded over HTTP; following the link does
+        # not rerun the page
+        csv_col, parquet_col = st.columns(2)
+        for col, label, name, write in [
+                (csv_col, "CSV", "selection.csv.gz", write_csv),
+                (parquet_col, "Parquet", "selection.parquet", write_parquet)]:
+            with col:
+                if st.button(f"Prepare {label}",
+                             key=f"{key}_{label.lower()}"):
+                    _download_link(label, name, write_export(
+                        name, write, export_chunks(
+                            page_rows, columns, sort_by, descending, total)))
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from component.reverse_mapping import codebook
+
+# Label <-> codebook code translation done with lookup arrays indexed by the
+# category codes, so the work per row is one array take and dictionaries are
+# only consulted once per category
+
+
+def label_code(series, label):
+    # -2 never occurs as a code (-1 is a missing value)
+    categories = series.cat.categories
+    return categories.get_loc(label) if label in categories else -2
+
+
+def is_label(series, label):
+    return series.cat.codes.to_numpy() == label_code(series, label)
+
+
+def yes_matrix(df, columns):
+    # Rows x columns booleans, True where the flag column is YES
+    codes = np.column_stack([df[column].cat.codes.to_numpy()
+                             for column in columns])
+    yes = np.array([label_code(df[column], "YES") for column in columns])
+    return codes == yes
+
+
+def to_codes(series, column=None):
+    # Labels -> codebook codes as a categorical over the codes in use;
+    # labels outside the codebook become missing
+    mapping = codebook(column or series.name)
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    table = np.array([mapping.get(label, -1)
+                      for label in series.cat.categories], dtype=np.int16)
+    values = np.unique(table[table >= 0])
+    lookup = np.append(np.searchsorted(values, table), -1)
+    lookup[:-1][table < 0] = -1
+    # Category code -1 (missing) picks the trailing -1
+    return pd.Series(pd.Categorical.from_codes(
+        lookup[series.cat.codes.to_numpy()], values),
+        index=series.index, name=series.name)
+
+
+def to_labels(values, column):
+    # Codebook codes -> labels as a categorical in codebook order; unknown
+    # and missing codes become missing
+    mapping = codebook(column)
+    labels = sorted(mapping, key=mapping.get)
+    codes = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(
+        dtype=float, na_value=np.nan)
+
+    table = np.full(max(mapping.values()) + 2, -1, dtype=np.int8)
+    table[[mapping[label] for label in labels]] = np.arange(len(labels))
+    # Anything not a whole number in range is sent to the trailing -1
+    known = (codes >= 0) & (codes < len(table) - 1) & (codes % 1 == 0)
+    index = np.where(known, np.nan_to_num(codes), -1).astype(np.intp)
+    return pd.Categorical.from_codes(table[index], labels)
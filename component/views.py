@@ -0,0 +1,19 @@
+import streamlit as st
+
+# Tabs whose content is only built while they are shown. st.tabs runs the
+# code of every tab on each rerun and hides all but one in the browser;
+# here the page asks which view is active and renders just that one.
+
+
+def view_tabs(labels, key):
+    # Renders the view switcher and returns the active label, the last one
+    # shown when the page is opened again
+    last = f"{key}_last"
+    if st.session_state.get(last) not in labels:
+        st.session_state[last] = labels[0]
+    if st.session_state.get(key) not in labels:
+        st.session_state[key] = st.session_state[last]
+    view = st.radio("View", labels, key=key, horizontal=True,
+                    label_visibility="collapsed")
+    st.session_state[last] = view
+    return view
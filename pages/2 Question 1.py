@@ -1,8 +1,9 @@
 import plotly.express as px
 import streamlit as st
-import pandas as pd
-import os
-from component.filter import filter
+from component.profiling import begin, panel, plotly_chart
+from component.selection import select_cases
+from component.summary import histogram_figure
+from component.views import view_tabs
 
 
 st.set_page_config(
@@ -10,50 +11,47 @@ st.set_page_config(
 )
 
 
-st.title("Which age groups are most susceptible to COVID-19?")
+begin("Question 1")
 
-df = pd.read_csv(os.path.join("assets", "mapped_data.csv"))
+st.title("Which age groups are most susceptible to COVID-19?")
 
-df = filter(df)
+selection = select_cases()
 
-total_selected = len(df)
+total_selected = len(selection)
 st.toast(f"Total Selected Cases: {total_selected:,}")
 
-tab1, tab2, tab3 = st.tabs(["Bar Chart", "Histogram", "Data Set"])
+# Only the active view is computed
+view = view_tabs(["Bar Chart", "Histogram", "Data Set"],
+                 key="question_1_view")
 
-with tab1:
+if view == "Bar Chart":
 
     st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
 
-    analysis = df.copy()
-    # Define the bins and labels
-    bins = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
-    labels = ['0-10', '10-20', '20-30', '30-40', '40-50',
-              '50-60', '60-70', '70-80', '80-90', '90-100']
-
-    # Create the binned AGE column
-    analysis['AGE_BIN'] = pd.cut(
-        analysis['AGE'], bins=bins, labels=labels, right=False)
-
-    # Count the occurrences of each age bin
-    age_group_counts = analysis['AGE_BIN'].value_counts().sort_index()
+    # Count the cases in each ten year age bin
+    age_counts = selection.age_group_counts()
     fig1 = px.bar(
-        x=age_group_counts.values,
-        y=age_group_counts.index,
+        x=age_counts.values,
+        y=age_counts.index,
         labels={"x": "Number of Cases",
                 "y": "Age Group",  "color": "Age Group"},
         title="COVID-19 Cases by Age Group",
-        color=age_group_counts.index,
-        color_discrete_sequence=px.colors.sequential.Viridis
+        color=age_counts.index,
+        color_discrete_sequence=px.colors.sequential.Viridis,
+        # 95% interval of the preview estimates
+        error_x=None if selection.exact else
+        selection.margin("age_group_counts").to_numpy()
     )
-    st.plotly_chart(fig1)
+    plotly_chart(fig1)
 
 
-with tab2:
+elif view == "Histogram":
     st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
 
-    fig2 = px.histogram(
-        analysis,
+    ages, cases = selection.distinct_counts("AGE")
+    fig2 = histogram_figure(
+        ages,
+        cases,
         x="AGE",
         nbins=20,
         labels={"AGE": "Age", "count": "Number of Cases"},
@@ -61,7 +59,10 @@ with tab2:
         color_discrete_sequence=["#636EFA"]
     )
 
-    st.plotly_chart(fig2)
+    plotly_chart(fig2)
+
+elif view == "Data Set":
+    selection.table(key="question_1")
 
-with tab3:
-    st.dataframe(df)
+# Stage timings of this rerun, shown when DASHBOARD_PROFILE is set
+panel()
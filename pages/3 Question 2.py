@@ -1,39 +1,34 @@
 import plotly.express as px
-from component.filter import filter
+from component.profiling import begin, panel, plotly_chart
+from component.selection import select_cases
+from component.views import view_tabs
 import streamlit as st
-import pandas as pd
-import os
 
 st.set_page_config(
     page_icon=":shark:", layout="wide"
 )
 
+begin("Question 2")
+
 st.title("How many patients required intubation?")
 
-df = pd.read_csv(os.path.join("assets", "mapped_data.csv"))
-df = filter(df)
+selection = select_cases()
 
-total_selected = len(df)
+total_selected = len(selection)
 st.toast(f"Total Selected Cases: {total_selected:,}")
 
-tab1, tab2 = st.tabs(["Bar Chart", "Data Set"])
-
-analysis = df.copy()
-
-# Define age bins
-bins = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
-labels = ["0-10", "10-20", "20-30", "30-40", "40-50",
-          "50-60", "60-70", "70-80", "80-90", "90-100"]
+# Only the active view is computed
+view = view_tabs(["Bar Chart", "Data Set"], key="question_2_view")
 
-# Bin the AGE column
-analysis["AGE_GROUP"] = pd.cut(
-    analysis["AGE"], bins=bins, labels=labels, right=False)
-
-with tab1:
+if view == "Bar Chart":
     st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
     # Count intubated patients
-    intubated_counts = analysis["INTUBATED"].value_counts().reset_index()
+    intubated_counts = selection.value_counts("INTUBATED").reset_index()
     intubated_counts.columns = ["INTUBATED", "COUNT"]
+    if not selection.exact:
+        # 95% interval of the preview estimates
+        intubated_counts["MARGIN"] = selection.margin(
+            "value_counts", "INTUBATED").to_numpy()
 
     # Bar chart for patients requiring intubation
     # Plotting the horizontal bar chart
@@ -44,11 +39,15 @@ with tab1:
         labels={"INTUBATED": "Intubation Status",
                 "COUNT": "Number of Patients"},
         color="INTUBATED",
-        color_discrete_sequence=px.colors.qualitative.Set2
+        color_discrete_sequence=px.colors.qualitative.Set2,
+        error_x=None if selection.exact else "MARGIN"
     )
-    st.plotly_chart(fig4)
+    plotly_chart(fig4)
 
 
-with tab2:
+elif view == "Data Set":
     st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
-    st.dataframe(df)
+    selection.table(key="question_2")
+
+# Stage timings of this rerun, shown when DASHBOARD_PROFILE is set
+panel()
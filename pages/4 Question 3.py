@@ -1,43 +1,38 @@
 import plotly.express as px
 import streamlit as st
-import pandas as pd
-import os
-from component.filter import filter
-from component.reverse_mapping import reverse_mapping
+from component.analysis import DISEASE_COLUMNS
+from component.comorbidity import OUTCOMES, heatmap_figure, rates_figure
+from component.filter import FILTER_COLUMNS
+from component.profiling import begin, panel, plotly_chart
+from component.selection import select_cases
+from component.views import view_tabs
 
-st.title("Any correlations between other diseases and ICU admission?")
+begin("Question 3")
 
-df = pd.read_csv(os.path.join("assets", "mapped_data.csv"))
+st.title("Any correlations between other diseases and ICU admission?")
 
-# Filter here
-df = filter(df)
+# Only the filter inputs and the disease/ICU flags are read
+selection = select_cases(FILTER_COLUMNS + DISEASE_COLUMNS + ['ICU'])
 
-total_selected = len(df)
+total_selected = len(selection)
 st.toast(f"Total Selected Cases: {total_selected:,}")
 
-tab1, tab2 = st.tabs(["Bubble Chart", "Data Set"])
+# Only the active view is computed
+view = view_tabs(["Bubble Chart", "Co-occurrence", "Rates", "Data Set"],
+                 key="question_3_view")
 
-with tab1:
+if view == "Bubble Chart":
     st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
-    # Select the relevant columns
-    columns_of_interest = ['DIABETES', 'COPD', 'ASTHMA', 'INMUSUPR', 'HYPERTENSION',
-                           'CARDIOVASCULAR', 'OBESITY', 'CHRONIC_KIDNEY', 'TOBACCO', 'ICU']
-
-    # Filter the DataFrame to only include those columns
-    df_selected = df[columns_of_interest]
-
-    # Rows where ICU is "YES"
-    df_filtered = df_selected[df_selected['ICU'] == 'YES']
-
-    # Drop the ICU column
-    df_filtered = df_filtered.drop(columns=['ICU'])
-
-    # Count the number of "YES" for each disease
-    yes_counts = (df_filtered == 'YES').sum()
+    # Count the number of "YES" for each disease where ICU is "YES"
+    disease_counts = selection.comorbidity().marginals("ICU")
 
     # Create a DataFrame for plotting
-    disease_counts = yes_counts.reset_index()
+    disease_counts = disease_counts.reset_index()
     disease_counts.columns = ['Disease', 'YES_Count']
+    if not selection.exact:
+        # 95% interval of the preview estimates
+        disease_counts['Margin'] = selection.margin(
+            "marginals", "ICU").to_numpy()
 
     # Create the bubble plot
     fig = px.scatter(disease_counts,
@@ -49,12 +44,53 @@ with tab1:
                      color='YES_Count',
                      color_continuous_scale='Viridis',  # Color scale for bubbles
                      hover_name='Disease',  # Tooltip on hover
-                     size_max=60)  # Maximum bubble size
+                     size_max=60,  # Maximum bubble size
+                     error_y=None if selection.exact else 'Margin')
 
     # Show the plot
-    st.plotly_chart(fig)
+    plotly_chart(fig)
 
 
-with tab2:
+elif view == "Co-occurrence":
     st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
-    st.dataframe(df)
+    # Every pair of diseases, from the same comorbidity table
+    table = selection.comorbidity()
+    outcome = st.selectbox("Outcome", list(OUTCOMES),
+                           index=list(OUTCOMES).index("ICU"),
+                           key="question_3_outcome")
+    measure = st.radio("Measure", ["Patients", "Correlation"],
+                       horizontal=True, key="question_3_measure")
+    if measure == "Patients":
+        fig = heatmap_figure(table.pairs(outcome),
+                             title=f"Diseases in pairs, {outcome} patients",
+                             labels={"color": "Patients"},
+                             color_continuous_scale="Viridis")
+    else:
+        fig = heatmap_figure(table.correlation(outcome), text_auto=".2f",
+                             title=f"Disease correlation (phi), "
+                                   f"{outcome} patients",
+                             labels={"color": "Phi"}, zmin=-1, zmax=1,
+                             color_continuous_scale="RdBu")
+    plotly_chart(fig)
+
+elif view == "Rates":
+    st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
+    # Share of the patients with each disease that had the outcome, with a
+    # 95% Wilson interval
+    table = selection.comorbidity()
+    outcome = st.selectbox("Outcome", list(OUTCOMES),
+                           index=list(OUTCOMES).index("ICU"),
+                           key="question_3_outcome")
+    rates = table.rates(outcome)
+    fig = rates_figure(rates, title=f"{outcome} rate by disease",
+                       labels={"RATE": "Rate", "Disease": "Disease"})
+    plotly_chart(fig)
+    st.dataframe(rates.style.format(
+        {"RATE": "{:.1%}", "LOW": "{:.1%}", "HIGH": "{:.1%}"}))
+
+elif view == "Data Set":
+    st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
+    selection.table(key="question_3")
+
+# Stage timings of this rerun, shown when DASHBOARD_PROFILE is set
+panel()
@@ -1,45 +1,42 @@
-from component.filter import filter
+from component.comorbidity import OUTCOMES, heatmap_figure, rates_figure
+from component.profiling import begin, panel, plotly_chart
 from component.reverse_mapping import reverse_mapping
+from component.selection import select_cases
+from component.views import view_tabs
 import streamlit as st
 import plotly.express as px
-import pandas as pd
-import os
 
 
 st.set_page_config(
     page_icon=":shark:", layout="wide"
 )
 
-st.title("What are the common diseases that the deceased patients had?")
+begin("Question 4")
 
-df = pd.read_csv(os.path.join("assets", "mapped_data.csv"))
+st.title("What are the common diseases that the deceased patients had?")
 
-# Filter here
-df = filter(df)
+selection = select_cases()
 
-total_selected = len(df)
+total_selected = len(selection)
 st.toast(f"Total Selected Cases: {total_selected:,}")
 
-df = reverse_mapping(df)
+# Only the active view is computed
+view = view_tabs(["Bar Chart", "Co-occurrence", "Rates", "Data Set"],
+                 key="question_4_view")
 
-tab1, tab2 = st.tabs(["Bar Chart", "Data Set"])
-
-with tab1:
+if view == "Bar Chart":
     st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
-    # Filter deceased patients (assuming DATE_OF_DEATH is not NaN when a patient is deceased)
-    deceased_patients = df[df["DATE_OF_DEATH"].notna()]
-
-    # Define disease columns
-    disease_columns = ['DIABETES', 'COPD', 'ASTHMA', 'INMUSUPR', 'HYPERTENSION',
-                       'CARDIOVASCULAR', 'OBESITY', 'CHRONIC_KIDNEY', 'TOBACCO']
-
-    # Convert disease values: 1 (YES), else 0 (NO)
-    disease_counts = deceased_patients[disease_columns].applymap(
-        lambda x: 1 if x == 1 else 0).sum()
+    # Count the YES values of each disease among the deceased patients
+    # (DATE_OF_DEATH is not NaN when a patient is deceased)
+    disease_counts = selection.comorbidity().marginals("DECEASED")
 
     # 🔹 Convert Series to DataFrame
     disease_counts_df = disease_counts.reset_index()
     disease_counts_df.columns = ['Disease', 'Count']  # Rename columns properly
+    if not selection.exact:
+        # 95% interval of the preview estimates
+        disease_counts_df['Margin'] = selection.margin(
+            "marginals", "DECEASED").to_numpy()
 
     # 🔹 Create bar chart
     fig = px.bar(disease_counts_df,
@@ -49,18 +46,55 @@ with tab1:
                  labels={"Count": "Number of Deceased Patients",
                          "Disease": "Disease"},
                  color="Disease",  # Different colors for each disease
-                 color_discrete_sequence=px.colors.qualitative.Set1)
+                 color_discrete_sequence=px.colors.qualitative.Set1,
+                 error_x=None if selection.exact else 'Margin')
 
     # Rotate x-axis labels for readability
     fig.update_xaxes(tickangle=45)
 
-    st.plotly_chart(fig)
+    plotly_chart(fig)
 
-with tab2:
+elif view == "Co-occurrence":
     st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
-    st.dataframe(df)
-
+    # Every pair of diseases, from the same comorbidity table
+    table = selection.comorbidity()
+    outcome = st.selectbox("Outcome", list(OUTCOMES),
+                           index=list(OUTCOMES).index("DECEASED"),
+                           key="question_4_outcome")
+    measure = st.radio("Measure", ["Patients", "Correlation"],
+                       horizontal=True, key="question_4_measure")
+    if measure == "Patients":
+        fig = heatmap_figure(table.pairs(outcome),
+                             title=f"Diseases in pairs, {outcome} patients",
+                             labels={"color": "Patients"},
+                             color_continuous_scale="Viridis")
+    else:
+        fig = heatmap_figure(table.correlation(outcome), text_auto=".2f",
+                             title=f"Disease correlation (phi), "
+                                   f"{outcome} patients",
+                             labels={"color": "Phi"}, zmin=-1, zmax=1,
+                             color_continuous_scale="RdBu")
+    plotly_chart(fig)
+
+elif view == "Rates":
+    st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
+    # Share of the patients with each disease that had the outcome, with a
+    # 95% Wilson interval
+    table = selection.comorbidity()
+    outcome = st.selectbox("Outcome", list(OUTCOMES),
+                           index=list(OUTCOMES).index("DECEASED"),
+                           key="question_4_outcome")
+    rates = table.rates(outcome)
+    fig = rates_figure(rates, title=f"{outcome} rate by disease",
+                       labels={"RATE": "Rate", "Disease": "Disease"})
+    plotly_chart(fig)
+    st.dataframe(rates.style.format(
+        {"RATE": "{:.1%}", "LOW": "{:.1%}", "HIGH": "{:.1%}"}))
+
+elif view == "Data Set":
+    st.write(f"📌 **Total Selected Cases**: {total_selected:,}")
+    # Shown with the codebook values
+    selection.table(key="question_4", transform=reverse_mapping)
 
-# # Load dataset
-# df = pd.read_csv("dataset.csv")
-# df.columns = map(str.upper, df.columns)  # Ensure column names are uppercase
+# Stage timings of this rerun, shown when DASHBOARD_PROFILE is set
+panel()
@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from component.analysis import DISEASE_COLUMNS, age_group_counts, value_counts
+from component.comorbidity import comorbidity
+from component.cube import (SOURCE_COLUMNS, build_cube, cube_path, totals,
+                            write_cube, year_month_counts)
+from component.filter import FILTER_COLUMNS
+from component.filter_index import FilterIndex
+from component.filter_spec import canonical
+from component.ingest import write_dataset
+from component.loader import read_data
+from component.parallel import WORKERS, aggregate_parallel
+from component.reverse_mapping import reverse_mapping
+from component.streaming import aggregate
+from component.summary import (distinct_counts, grouped_box_summaries,
+                               histogram_bins)
+from script.generate import SIZES, parse_rows, write_csv
+
+# Times each stage of the app's data path on synthetic data, outside of
+# Streamlit, and writes the results as JSON:
+#
+#   python -m script.benchmark 1m --output bench-1m.json
+#   python -m script.benchmark 1m --compare bench-1m.json
+#
+# Data is generated and ingested once into --data-dir and reused.
+
+DATA_DIR = os.path.join("assets", "benchmark")
+
+PAGE_COLUMNS = FILTER_COLUMNS + DISEASE_COLUMNS + ["ICU"]
+
+
+def default_spec(index, **predicates):
+    # What filter_spec() returns with untouched widgets: full age and date
+    # ranges
+    everything = index.all()
+    spec = [(column, "between",
+             (index.min(column, everything), index.max(column, everything)))
+            for column in ["AGE", "DATE_OF_FIRST_SYMPTOM", "ADMISSION DATE"]]
+    spec += [(column, op, value)
+             for column, (op, value) in predicates.items()]
+    return canonical(spec)
+
+
+def filter_specs(index):
+    return {
+        "default": default_spec(index),
+        "female_20_60": canonical([("SEX", "in", ("FEMALE",)),
+                                   ("AGE", "between", (20, 60))]),
+        "hospitalized_icu": default_spec(index, HOSPITALIZED=("==", "YES"),
+                                         ICU=("==", "YES")),
+        "comorbid_deceased": default_spec(
+            index, DIABETES=("==", "YES"), HYPERTENSION=("==", "YES"),
+            DATE_OF_DEATH=("between", ("2020-06-01", "2021-06-30"))),
+        "alive_admitted_2021": canonical([
+            ("DATE_OF_DEATH", "isnull", True),
+            ("ADMISSION DATE", "between", ("2021-01-01", "2021-12-31"))]),
+    }
+
+
+def home(cube):
+    cube = cube[cube["AGE"].notna()]
+    totals(cube, "SEX")
+    totals(cube, "HOSPITALIZED")
+    totals(cube, "ICU")
+    totals(cube, "INTUBATED")
+    totals(cube, "OUTCOME")
+    year_month_counts(cube, "ADMISSION_YM")
+    year_month_counts(cube, "DEATH_YM")
+    grouped_box_summaries(totals(cube, ["HOSPITALIZED", "AGE"]))
+
+
+def question_1(df):
+    age_group_counts(df["AGE"])
+    histogram_bins(*distinct_counts(df["AGE"].to_numpy()), nbins=20)
+
+
+def question_2(df):
+    value_counts(df["INTUBATED"])
+
+
+def question_3(df):
+    table = comorbidity(df)
+    table.marginals("ICU")
+    table.pairs("ICU")
+    table.rates("ICU")
+
+
+def question_4(df):
+    table = comorbidity(df)
+    table.marginals("DECEASED")
+    table.pairs("DECEASED")
+    table.rates("DECEASED")
+    reverse_mapping(df.copy())
+
+
+def measure(fn, repeat):
+    # Timings without tracing, then one traced run for the peak of Python and
+    # NumPy allocations (Arrow's own memory pool is not seen by tracemalloc)
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"seconds": seconds, "median": float(np.median(seconds)),
+                    "min": min(seconds), "peak_bytes": peak}
+
+
+def prepare(rows, data_dir):
+    source = os.path.join(data_dir, f"cases-{rows}.csv")
+    dataset = os.path.join(data_dir, f"cases-{rows}")
+    if not os.path.exists(source):
+        print(f"Generating {rows:,} rows into {source}")
+        write_csv(rows, source)
+    if not os.path.exists(cube_path(dataset)):
+        print(f"Ingesting {source}")
+        df = read_data(source)
+        write_dataset(df, dataset)
+        write_cube(df, dataset)
+    return source, dataset
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(rows, data_dir=DATA_DIR, repeat=3, csv=False):
+    source, dataset = prepare(rows, data_dir)
+    stages = {}
+
+    def stage(name, fn):
+        print(f"  {name}", file=sys.stderr)
+        result, stages[name] = measure(fn, repeat)
+        return result
+
+    if csv:
+        stage("load/csv", lambda: read_data(source, columns=PAGE_COLUMNS))
+    stage("load/all_columns", lambda: read_data(dataset))
+    df = stage("load/page_columns",
+               lambda: read_data(dataset, columns=PAGE_COLUMNS))
+
+    index = stage("filter/index", lambda: FilterIndex(df))
+    selections = {}
+    for name, spec in filter_specs(index).items():
+        selections[name] = stage(
+            f"filter/{name}",
+            lambda spec=spec: df.iloc[index.rows(index.select(spec))])
+
+    cube = stage("home/cube",
+                 lambda: build_cube(read_data(dataset, columns=SOURCE_COLUMNS)))
+    stage("home/aggregate", lambda: home(cube))
+    for name, page in [("question_1", question_1), ("question_2", question_2),
+                       ("question_3", question_3), ("question_4", question_4)]:
+        for selection in ["default", "hospitalized_icu"]:
+            stage(f"{name}/{selection}",
+                  lambda page=page, selection=selection:
+                  page(selections[selection]))
+
+    # The same aggregations in bounded memory, straight off the dataset
+    specs = filter_specs(index)
+    for selection in ["default", "hospitalized_icu"]:
+        stage(f"streaming/{selection}",
+              lambda selection=selection: aggregate(specs[selection], dataset))
+    # ... and over worker processes, once the pool is started
+    aggregate_parallel(specs["default"], dataset)
+    for selection in ["default", "hospitalized_icu"]:
+        stage(f"parallel/{selection}",
+              lambda selection=selection: aggregate_parallel(specs[selection],
+                                                             dataset))
+
+    return {
+        "rows": rows,
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "workers": WORKERS,
+        "selected_rows": {name: len(selection)
+                          for name, selection in selections.items()},
+        # Peak resident set of the whole run, in bytes on Linux
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        * (1 if sys.platform == "darwin" else 1024),
+        "stages": stages,
+    }
+
+
+def compare(result, baseline):
+    print(f"{'stage':<34}{'baseline':>10}{'now':>10}{'ratio':>8}")
+    for name, now in result["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            print(f"{name:<34}{'-':>10}{now['median']:>10.4f}")
+            continue
+        ratio = now["median"] / before["median"] if before["median"] else 0
+        print(f"{name:<34}{before['median']:>10.4f}{now['median']:>10.4f}"
+              f"{ratio:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark load, filtering and the page aggregations on "
+                    "synthetic data.")
+    parser.add_argument("rows", type=parse_rows,
+                        help="row count or one of " + ", ".join(SIZES))
+    parser.add_argument("--data-dir", default=DATA_DIR,
+                        help="where generated data is kept "
+                             "(default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--csv", action="store_true",
+                        help="also time loading straight from the CSV")
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--compare", help="earlier results to compare with")
+    args = parser.parse_args(argv)
+
+    result = run(args.rows, args.data_dir, args.repeat, args.csv)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    elif not args.output:
+        json.dump(result, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
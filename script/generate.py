@@ -0,0 +1,156 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from component.reverse_mapping import codebook
+
+# Synthetic stand-in for assets/mapped_data.csv: same columns and codebook
+# labels, with rough real-world shares (age skew, comorbidities rising with
+# age, hospital-only ICU/intubation, deaths concentrated among the
+# hospitalized and admissions in three waves)
+
+COLUMNS = ["SEX", "AGE", "NATIONALITY", "ORIGIN", "SECTOR",
+           "SPEAKS_NATIVE_LANGUAGE", "MIGRANT", "PNEUMONIA", "COPD",
+           "CARDIOVASCULAR", "OBESITY", "PREGNANCY", "ASTHMA",
+           "CHRONIC_KIDNEY", "TOBACCO", "DIABETES", "INMUSUPR",
+           "HYPERTENSION", "OTHER_DISEASE", "ANOTHER_CASE", "HOSPITALIZED",
+           "ICU", "INTUBATED", "DATE_OF_FIRST_SYMPTOM", "ADMISSION DATE",
+           "DATE_OF_DEATH", "OUTCOME"]
+
+SIZES = {"100k": 100_000, "1m": 1_000_000, "10m": 10_000_000,
+         "50m": 50_000_000}
+
+# Rows generated and written at a time, each chunk from its own seed
+CHUNK_ROWS = 1_000_000
+
+# Share of YES at age 45; younger cases have less, older cases more
+PREVALENCE = {"PNEUMONIA": 0.14, "DIABETES": 0.12, "HYPERTENSION": 0.16,
+              "OBESITY": 0.15, "TOBACCO": 0.08, "ASTHMA": 0.03,
+              "COPD": 0.015, "INMUSUPR": 0.015, "CARDIOVASCULAR": 0.02,
+              "CHRONIC_KIDNEY": 0.02, "OTHER_DISEASE": 0.03}
+
+ORIGINS = {"NONE": 0.97, "USA": 0.012, "SPAIN": 0.008, "CHINA": 0.005,
+           "ITALY": 0.005}
+SECTORS = {"SSA": 0.6, "IMSS": 0.3, "PRIVATE": 0.05, "ISSSTE": 0.03,
+           "PEMEX": 0.02}
+
+FIRST_DAY = np.datetime64("2020-01-01")
+DAYS = 731
+# Admission waves as (day, spread in days, share of cases)
+WAVES = [(200, 45, 0.35), (385, 35, 0.4), (580, 40, 0.25)]
+
+
+def _choice(rng, shares, n):
+    labels = list(shares)
+    p = np.array([shares[label] for label in labels], dtype=float)
+    return pd.Categorical.from_codes(rng.choice(len(labels), n, p=p / p.sum()),
+                                     labels)
+
+
+def _flag(rng, p_yes, n, ignored=0.003, unknown=0.002):
+    # Codebook YES / NO / IGNORED / UNKNOWN with a per-row YES probability
+    labels = sorted(codebook("ICU"), key=codebook("ICU").get)
+    draw = rng.random(n)
+    codes = np.where(draw < p_yes, labels.index("YES"), labels.index("NO"))
+    codes = np.where(draw > 1 - ignored - unknown, labels.index("IGNORED"),
+                     codes)
+    codes = np.where(draw > 1 - unknown, labels.index("UNKNOWN"), codes)
+    return pd.Categorical.from_codes(codes, labels)
+
+
+def _where(condition, yes, no):
+    # Both categoricals share their categories
+    return pd.Categorical.from_codes(np.where(condition, yes.codes, no.codes),
+                                     no.categories)
+
+
+def _dates(days):
+    # Day offsets -> "YYYY-MM-DD" through a table of the few distinct days
+    table = np.datetime_as_string(FIRST_DAY + np.arange(DAYS + 120), unit="D")
+    out = np.full(len(days), "", dtype=object)
+    known = days >= 0
+    out[known] = table[days[known]]
+    return pd.Series(out).replace("", np.nan)
+
+
+def generate(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = {}
+    df["SEX"] = _choice(rng, {"FEMALE": 0.5, "MALE": 0.49, "UNKNOWN": 0.01}, n)
+    age = np.clip(rng.gamma(4.0, 10.5, n), 0, 99).astype(np.int64)
+    df["AGE"] = age
+    df["NATIONALITY"] = _choice(
+        rng, {"MEXICAN": 0.993, "FOREIGN": 0.006, "UNKNOWN": 0.001}, n)
+    df["ORIGIN"] = _choice(rng, ORIGINS, n)
+    df["SECTOR"] = _choice(rng, SECTORS, n)
+    df["SPEAKS_NATIVE_LANGUAGE"] = _flag(rng, 0.01, n, ignored=0.02)
+    df["MIGRANT"] = _flag(rng, 0.001, n, unknown=0.9)
+
+    age_factor = np.clip(age / 45, 0.1, 2.5)
+    conditions = np.zeros(n, dtype=np.int64)
+    for column, share in PREVALENCE.items():
+        df[column] = _flag(rng, share * age_factor, n)
+        conditions += df[column].codes == df[column].categories.get_loc("YES")
+
+    female = df["SEX"].codes == df["SEX"].categories.get_loc("FEMALE")
+    pregnancy = _flag(rng, np.where((age >= 15) & (age <= 45), 0.02, 0), n)
+    not_applicable = pd.Categorical(["DOES NOT APPLY"] * n,
+                                    categories=pregnancy.categories)
+    df["PREGNANCY"] = _where(female, pregnancy, not_applicable)
+    df["ANOTHER_CASE"] = _flag(rng, 0.4, n, unknown=0.1)
+
+    hospitalized = rng.random(n) < np.clip(
+        0.03 + 0.004 * age + 0.06 * conditions, 0, 0.9)
+    df["HOSPITALIZED"] = pd.Categorical(
+        np.where(hospitalized, "YES", "NO"), categories=["NO", "YES"])
+    for column, share in (("ICU", 0.1), ("INTUBATED", 0.12)):
+        df[column] = _where(hospitalized, _flag(rng, share, n), not_applicable)
+
+    wave = rng.choice(len(WAVES), n, p=[w[2] for w in WAVES])
+    centers = np.array([w[0] for w in WAVES])[wave]
+    spreads = np.array([w[1] for w in WAVES])[wave]
+    admission = np.clip(rng.normal(centers, spreads), 0, DAYS - 1)
+    admission = admission.astype(np.int64)
+    symptoms = np.maximum(admission - rng.geometric(0.25, n) + 1, 0)
+    deceased = rng.random(n) < np.where(
+        hospitalized, np.clip(0.05 + 0.004 * age, 0, 0.6), 0.003)
+    death = np.where(deceased, admission + rng.geometric(0.08, n) - 1, -1)
+
+    df["DATE_OF_FIRST_SYMPTOM"] = _dates(symptoms)
+    df["ADMISSION DATE"] = _dates(admission)
+    df["DATE_OF_DEATH"] = _dates(np.minimum(death, DAYS + 119))
+    df["OUTCOME"] = _choice(
+        rng, {"POSITIVE": 0.4, "NEGATIVE": 0.5, "PENDING": 0.1}, n)
+    return pd.DataFrame(df)[COLUMNS]
+
+
+def write_csv(rows, output, seed=0):
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", newline="") as f:
+        for chunk, start in enumerate(range(0, rows, CHUNK_ROWS)):
+            df = generate(min(CHUNK_ROWS, rows - start), seed=(seed, chunk))
+            df.to_csv(f, index=False, header=start == 0)
+
+
+def parse_rows(value):
+    return SIZES.get(value.lower()) or int(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic case CSV with the columns and labels "
+                    "of assets/mapped_data.csv.")
+    parser.add_argument("rows", type=parse_rows,
+                        help="row count or one of " + ", ".join(SIZES))
+    parser.add_argument("output", help="CSV file to write")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    write_csv(args.rows, args.output, args.seed)
+    print(f"Wrote {args.rows:,} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
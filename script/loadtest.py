@@ -0,0 +1,405 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.Slider_pb2 import Slider
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+from component.loader import BACKEND
+from script.benchmark import git_commit
+
+# Simulated analysts on one dashboard host, without a browser:
+#
+#   python -m script.loadtest --sessions 20 --steps 30 --output load-20.json
+#   python -m script.loadtest --sessions 20 --compare load-20.json
+#
+# Starts `streamlit run Home.py` (or uses --url) and connects one websocket
+# per session, speaking the browser client's protocol, so every rerun runs
+# the real page scripts and the filter panel of component.filter in the
+# server. Each session opens Home, then in a random sequence changes one to
+# three filters and applies them, switches views and switches pages, with an
+# exponential think time between reruns. The server's resident memory is
+# sampled as sessions join; settings such as DASHBOARD_BACKEND are passed on
+# to the server started here.
+
+# Chance of each step being a filter change, a view switch or a page switch
+ACTIONS = {"filter": 0.7, "view": 0.2, "page": 0.1}
+
+# Widgets a session can change
+WIDGETS = ["selectbox", "multiselect", "slider", "date_input", "radio",
+           "button"]
+
+# Whole pages of charts can exceed tornado's default of 10 MiB
+MAX_MESSAGE_BYTES = 1 << 30
+
+STARTUP_SECONDS = 120
+
+
+def _status(pid, field):
+    # A /proc/<pid>/status field in bytes, None where there is no /proc
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def resident_bytes(pid):
+    return _status(pid, "VmRSS")
+
+
+def peak_resident_bytes(pid):
+    return _status(pid, "VmHWM")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port=None):
+    port = port or _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", "Home.py",
+         "--server.headless=true", f"--server.port={port}",
+         "--server.fileWatcherType=none",
+         "--browser.gatherUsageStats=false"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + STARTUP_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Streamlit exited while starting")
+        try:
+            urllib.request.urlopen(url + "/_stcore/health", timeout=1)
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Streamlit did not answer on {url}")
+
+
+def _dates(strings):
+    return [datetime.strptime(value, "%Y/%m/%d") for value in strings]
+
+
+def random_state(kind, widget, rng):
+    # A new value for a widget, as the browser would send it. Choices go
+    # back to "All" or the full range about half the time so selections do
+    # not only ever narrow.
+    state = WidgetState(id=widget.id)
+    if kind in ("selectbox", "radio"):
+        keep_all = kind == "selectbox" and rng.random() < 0.5
+        state.int_value = 0 if keep_all else rng.randrange(
+            len(widget.options))
+    elif kind == "multiselect":
+        size = rng.randint(0, min(2, len(widget.options)))
+        state.int_array_value.data.extend(
+            sorted(rng.sample(range(len(widget.options)), size)))
+    elif kind == "slider":
+        low, high = widget.min, widget.max
+        if rng.random() >= 0.5:
+            low, high = sorted(rng.uniform(widget.min, widget.max)
+                               for _ in range(2))
+            if widget.data_type == Slider.INT:
+                low, high = round(low), round(high)
+        state.double_array_value.data.extend([low, high])
+    elif kind == "date_input":
+        first, last = _dates(widget.default)
+        days = (last - first).days
+        if rng.random() >= 0.5 and days > 0:
+            start, stop = sorted(rng.randint(0, days) for _ in range(2))
+            first, last = (first + timedelta(start),
+                           first + timedelta(stop))
+        state.string_array_value.data.extend(
+            [first.strftime("%Y/%m/%d"), last.strftime("%Y/%m/%d")])
+    return state
+
+
+class Session:
+    # One browser tab: its websocket, the app's pages and the widgets of its
+    # last run
+
+    def __init__(self, url, rng):
+        self.url = url
+        self.rng = rng
+        self.pages = {}
+        self.page = ""
+        self.widgets = []
+        self.errors = 0
+        self.timings = []
+
+    async def connect(self):
+        self.connection = await websocket_connect(
+            self.url.replace("http", "ws", 1) + "/_stcore/stream",
+            max_message_size=MAX_MESSAGE_BYTES)
+
+    def close(self):
+        self.connection.close()
+
+    def _pages(self, pages):
+        for page in pages:
+            self.pages[page.page_script_hash] = page.page_name
+
+    async def rerun(self, action, states=()):
+        # Sends the changed widget states and waits for the run to finish;
+        # the server keeps the others
+        message = BackMsg()
+        message.rerun_script.page_script_hash = self.page
+        message.rerun_script.widget_states.widgets.extend(states)
+        start = time.perf_counter()
+        await self.connection.write_message(message.SerializeToString(),
+                                            binary=True)
+        widgets = []
+        while True:
+            data = await self.connection.read_message()
+            if data is None:
+                raise ConnectionError("The server closed the session")
+            forward = ForwardMsg.FromString(data)
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                self._pages(forward.new_session.app_pages)
+                self.page = forward.new_session.page_script_hash
+            elif kind == "navigation":
+                self._pages(forward.navigation.app_pages)
+            elif (kind == "delta"
+                  and forward.delta.WhichOneof("type") == "new_element"):
+                element = forward.delta.new_element
+                name = element.WhichOneof("type")
+                if name == "exception":
+                    self.errors += 1
+                elif name in WIDGETS:
+                    widgets.append((name, getattr(element, name)))
+            elif (kind == "script_finished" and forward.script_finished
+                  != ForwardMsg.FINISHED_EARLY_FOR_RERUN):
+                break
+        self.widgets = widgets
+        self.timings.append({"action": action,
+                             "page": self.pages.get(self.page, self.page),
+                             "seconds": time.perf_counter() - start})
+
+    async def change_filters(self):
+        # One to three widgets of the filter form, submitted together, or
+        # one widget on a page whose filters apply on every change (Home)
+        submit = next((widget for kind, widget in self.widgets
+                       if kind == "button" and widget.is_form_submitter),
+                      None)
+        form_id = submit.form_id if submit is not None else ""
+        fields = [(kind, widget) for kind, widget in self.widgets
+                  if kind not in ("radio", "button")
+                  and widget.form_id == form_id]
+        if not fields:
+            return await self.rerun("rerun")
+        most = 3 if submit is not None else 1
+        changes = self.rng.sample(fields, self.rng.randint(
+            1, min(most, len(fields))))
+        states = [random_state(kind, widget, self.rng)
+                  for kind, widget in changes]
+        if submit is not None:
+            states.append(WidgetState(id=submit.id, trigger_value=True))
+        await self.rerun("filter", states)
+
+    async def switch_view(self):
+        radios = [widget for kind, widget in self.widgets
+                  if kind == "radio" and not widget.form_id]
+        if not radios:
+            return await self.rerun("rerun")
+        widget = self.rng.choice(radios)
+        await self.rerun("view", [random_state("radio", widget, self.rng)])
+
+    async def switch_page(self):
+        others = [page for page in self.pages if page != self.page]
+        if not others:
+            return await self.rerun("rerun")
+        self.page = self.rng.choice(others)
+        await self.rerun("page")
+
+    async def wander(self, steps, think):
+        actions = {"filter": self.change_filters, "view": self.switch_view,
+                   "page": self.switch_page}
+        for _ in range(steps):
+            if think:
+                await asyncio.sleep(self.rng.expovariate(1 / think))
+            action = self.rng.choices(list(ACTIONS),
+                                      weights=list(ACTIONS.values()))[0]
+            await actions[action]()
+
+
+def percentiles(seconds):
+    if not seconds:
+        return None
+    return {"count": len(seconds), "mean": float(np.mean(seconds)),
+            "p50": float(np.percentile(seconds, 50)),
+            "p90": float(np.percentile(seconds, 90)),
+            "p95": float(np.percentile(seconds, 95)),
+            "p99": float(np.percentile(seconds, 99)),
+            "max": float(np.max(seconds))}
+
+
+def _grouped(timings, field):
+    groups = {}
+    for timing in timings:
+        groups.setdefault(timing[field], []).append(timing["seconds"])
+    return {name: percentiles(seconds) for name, seconds in groups.items()}
+
+
+async def simulate(url, sessions, steps, think, seed, pid=None):
+    def memory():
+        return resident_bytes(pid) if pid else None
+
+    # A first session loads the data and fills the caches every session
+    # shares; per session memory is counted from there
+    warm = Session(url, random.Random(seed))
+    await warm.connect()
+    await warm.rerun("open")
+    baseline = memory()
+
+    # Sessions join one at a time...
+    clients, ramp = [], []
+    for number in range(sessions):
+        session = Session(url, random.Random(seed + 1 + number))
+        await session.connect()
+        await session.rerun("open")
+        clients.append(session)
+        ramp.append(memory())
+    opened = [timing["seconds"] for session in clients
+              for timing in session.timings]
+    for session in clients:
+        session.timings.clear()
+
+    # ... then all work at once
+    start = time.perf_counter()
+    await asyncio.gather(*(session.wander(steps, think)
+                           for session in clients))
+    seconds = time.perf_counter() - start
+    total = memory()
+    for session in [warm] + clients:
+        session.close()
+
+    timings = [timing for session in clients for timing in session.timings]
+    return {
+        "seconds": seconds,
+        "reruns": len(timings),
+        "reruns_per_second": len(timings) / seconds if seconds else None,
+        "errors": sum(session.errors for session in [warm] + clients),
+        "open_latency": percentiles(opened),
+        "latency": percentiles([timing["seconds"] for timing in timings]),
+        "latency_by_action": _grouped(timings, "action"),
+        "latency_by_page": _grouped(timings, "page"),
+        # Server process, with the warm-up session and `sessions` more
+        "memory": {
+            "baseline_bytes": baseline,
+            "ramp_bytes": ramp,
+            "total_bytes": total,
+            "peak_bytes": peak_resident_bytes(pid) if pid else None,
+            "per_session_bytes": (total - baseline) / sessions
+            if total is not None and baseline is not None else None,
+        },
+    }
+
+
+def run(sessions, steps=20, think=0.5, seed=0, url=None, port=None):
+    process = None
+    if url is None:
+        process, url = start_server(port)
+    try:
+        result = asyncio.run(simulate(url, sessions, steps, think, seed,
+                                      process.pid if process else None))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return dict({
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "backend": BACKEND,
+        "url": None if process else url,
+        "sessions": sessions,
+        "steps": steps,
+        "think_seconds": think,
+        "seed": seed,
+    }, **result)
+
+
+def compare(result, baseline):
+    rows = [("rerun p50 s", ("latency", "p50")),
+            ("rerun p90 s", ("latency", "p90")),
+            ("rerun p99 s", ("latency", "p99")),
+            ("open p50 s", ("open_latency", "p50")),
+            ("reruns/s", ("reruns_per_second",)),
+            ("MiB per session", ("memory", "per_session_bytes")),
+            ("MiB total", ("memory", "total_bytes"))]
+
+    def value(data, path):
+        for key in path:
+            data = data.get(key) if isinstance(data, dict) else None
+        if data is not None and path[-1].endswith("bytes"):
+            data /= 1 << 20
+        return data
+
+    print(f"{'':<18}{'baseline':>10}{'now':>10}{'ratio':>8}")
+    for name, path in rows:
+        before, now = value(baseline, path), value(result, path)
+        if before is None or now is None:
+            print(f"{name:<18}{'-':>10}{'-':>10}")
+            continue
+        ratio = now / before if before else 0
+        print(f"{name:<18}{before:>10.3f}{now:>10.3f}{ratio:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load test the dashboard with simulated concurrent "
+                    "sessions.")
+    parser.add_argument("--sessions", type=int, default=10,
+                        help="concurrent sessions (default: %(default)s)")
+    parser.add_argument("--steps", type=int, default=20,
+                        help="reruns per session (default: %(default)s)")
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="mean seconds between a session's reruns "
+                             "(default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url",
+                        help="a running dashboard to test instead of "
+                             "starting one; its memory is not measured")
+    parser.add_argument("--port", type=int,
+                        help="port for the started dashboard "
+                             "(default: a free one)")
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--compare", help="earlier results to compare with")
+    args = parser.parse_args(argv)
+
+    result = run(args.sessions, args.steps, args.think, args.seed, args.url,
+                 args.port)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    elif not args.output:
+        json.dump(result, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
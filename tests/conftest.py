@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from component.reverse_mapping import codebook
+
+# Random cases in the layout of assets/mapped_data.csv, shared by the tests
+# that compare one way of selecting or aggregating the data with another
+
+CSV_COLUMNS = ["SEX", "AGE", "NATIONALITY", "ORIGIN", "SECTOR",
+               "SPEAKS_NATIVE_LANGUAGE", "MIGRANT", "PNEUMONIA", "COPD",
+               "CARDIOVASCULAR", "OBESITY", "PREGNANCY", "ASTHMA",
+               "CHRONIC_KIDNEY", "TOBACCO", "DIABETES", "INMUSUPR",
+               "HYPERTENSION", "OTHER_DISEASE", "ANOTHER_CASE",
+               "HOSPITALIZED", "ICU", "INTUBATED", "DATE_OF_FIRST_SYMPTOM",
+               "ADMISSION DATE", "DATE_OF_DEATH", "OUTCOME"]
+
+RANGE_COLUMNS = ["AGE", "DATE_OF_FIRST_SYMPTOM", "ADMISSION DATE"]
+
+
+def random_cases(n, seed):
+    # Codebook labels drawn at random, deaths for some of the cases and some
+    # ages and dates missing so the ranges have nulls to leave out
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({column: rng.choice(list(codebook(column)), n)
+                          for column in CSV_COLUMNS
+                          if codebook(column) is not None})
+    frame["ORIGIN"] = rng.choice(["CHINA", "SPAIN", "USA", "NONE"], n)
+    frame["SECTOR"] = rng.choice(["IMSS", "ISSSTE", "PEMEX", "SSA"], n)
+    frame["AGE"] = rng.integers(0, 100, n)
+    first = pd.Timestamp("2020-01-01") + pd.to_timedelta(
+        rng.integers(0, 480, n), unit="D")
+    days = pd.to_timedelta(rng.integers(0, 15, n), unit="D")
+    frame["DATE_OF_FIRST_SYMPTOM"] = first
+    frame["ADMISSION DATE"] = first + days
+    frame["DATE_OF_DEATH"] = (frame["ADMISSION DATE"] + days).where(
+        rng.random(n) < 0.1)
+    for column in RANGE_COLUMNS:
+        frame[column] = frame[column].mask(rng.random(n) < 0.02)
+    return frame[CSV_COLUMNS]
+
+
+@pytest.fixture(scope="session")
+def cases_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp("data") / "cases.csv"
+    random_cases(3000, seed=3).to_csv(path, index=False)
+    return str(path)
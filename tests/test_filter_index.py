@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from component.filter import FILTER_COLUMNS
+from component.filter_index import FilterIndex
+from component.filter_spec import canonical, spec_mask
+from component.loader import read_data
+
+# FilterIndex.select() against the chained pandas filter the widgets used
+# before the index, on random widget choices
+
+YES_NO_COLUMNS = ["SPEAKS_NATIVE_LANGUAGE", "MIGRANT", "PNEUMONIA", "COPD",
+                  "CARDIOVASCULAR", "OBESITY", "PREGNANCY", "ASTHMA",
+                  "CHRONIC_KIDNEY", "TOBACCO", "DIABETES", "INMUSUPR",
+                  "HYPERTENSION", "OTHER_DISEASE", "ANOTHER_CASE",
+                  "HOSPITALIZED", "ICU", "INTUBATED"]
+
+RANGE_COLUMNS = ["AGE", "DATE_OF_FIRST_SYMPTOM", "ADMISSION DATE"]
+
+
+@pytest.fixture(scope="module")
+def df(cases_csv):
+    # Loaded like the app's data
+    return read_data(cases_csv, columns=FILTER_COLUMNS)
+
+
+@pytest.fixture(scope="module")
+def index(df):
+    return FilterIndex(df)
+
+
+def _between(df, column, value):
+    low, high = value
+    if column in RANGE_COLUMNS[1:] + ["DATE_OF_DEATH"]:
+        low, high = pd.to_datetime(low), pd.to_datetime(high)
+    return df[(df[column] >= low) & (df[column] <= high)]
+
+
+def chained(df, choices):
+    # The widgets' filter before FilterIndex: one boolean slice per choice,
+    # untouched ranges spanning the rows selected so far
+    if choices["SEX"]:
+        df = df[df["SEX"].isin(choices["SEX"])]
+    for column in ["AGE", "SPEAKS_NATIVE_LANGUAGE", "ORIGIN", "MIGRANT",
+                   "SECTOR"] + YES_NO_COLUMNS[2:15]:
+        value = choices.get(column)
+        if column == "AGE":
+            df = _between(df, column, value or (df[column].min(),
+                                                df[column].max()))
+        elif column == "SECTOR" and value:
+            df = df[df[column].isin(value)]
+        elif value not in (None, "All", []):
+            df = df[df[column] == value]
+    df = _between(df, "DATE_OF_FIRST_SYMPTOM",
+                  choices.get("DATE_OF_FIRST_SYMPTOM")
+                  or (df["DATE_OF_FIRST_SYMPTOM"].min(),
+                      df["DATE_OF_FIRST_SYMPTOM"].max()))
+    if choices["DEATH"] == "YES":
+        df = _between(df, "DATE_OF_DEATH", choices.get("DATE_OF_DEATH")
+                      or (df["DATE_OF_DEATH"].min(),
+                          df["DATE_OF_DEATH"].max()))
+    elif choices["DEATH"] == "NO":
+        df = df[df["DATE_OF_DEATH"].isnull()]
+    if choices.get("HOSPITALIZED", "All") != "All":
+        df = df[df["HOSPITALIZED"] == choices["HOSPITALIZED"]]
+    df = _between(df, "ADMISSION DATE", choices.get("ADMISSION DATE")
+                  or (df["ADMISSION DATE"].min(), df["ADMISSION DATE"].max()))
+    for column in ["ICU", "INTUBATED", "OUTCOME"]:
+        if choices.get(column, "All") != "All":
+            df = df[df[column] == choices[column]]
+    return df
+
+
+def widget_spec(df, choices):
+    # The same choices as filter_spec() turns them into a spec, untouched
+    # ranges spanning the whole data
+    spec = []
+    if choices["SEX"]:
+        spec.append(("SEX", "in", choices["SEX"]))
+    if choices.get("SECTOR"):
+        spec.append(("SECTOR", "in", choices["SECTOR"]))
+    for column in YES_NO_COLUMNS + ["ORIGIN", "OUTCOME"]:
+        if choices.get(column, "All") != "All":
+            spec.append((column, "==", choices[column]))
+    for column in RANGE_COLUMNS:
+        spec.append((column, "between", choices.get(column) or (
+            df[column].min(), df[column].max())))
+    if choices["DEATH"] == "YES":
+        spec.append(("DATE_OF_DEATH", "between", choices.get(
+            "DATE_OF_DEATH") or (df["DATE_OF_DEATH"].min(),
+                                 df["DATE_OF_DEATH"].max())))
+    elif choices["DEATH"] == "NO":
+        spec.append(("DATE_OF_DEATH", "isnull", True))
+    return canonical(spec)
+
+
+def _range(rng, df, column):
+    values = df[column].dropna().sort_values().to_numpy()
+    low, high = sorted(rng.choice(values, 2))
+    if column == "AGE":
+        return int(low), int(high)
+    return pd.Timestamp(low).date(), pd.Timestamp(high).date()
+
+
+def random_choices(rng, df):
+    choices = {"SEX": sorted(rng.choice(["FEMALE", "MALE", "UNKNOWN"],
+                                        rng.integers(0, 3), replace=False))}
+    for column in YES_NO_COLUMNS:
+        if rng.random() < 0.2:
+            choices[column] = str(rng.choice(["YES", "NO"]))
+    if rng.random() < 0.4:
+        choices["ORIGIN"] = str(rng.choice(df["ORIGIN"].cat.categories))
+    if rng.random() < 0.4:
+        choices["SECTOR"] = sorted(rng.choice(
+            df["SECTOR"].cat.categories, rng.integers(1, 3), replace=False))
+    if rng.random() < 0.3:
+        choices["OUTCOME"] = str(rng.choice(["POSITIVE", "NEGATIVE",
+                                             "PENDING"]))
+    for column in RANGE_COLUMNS:
+        if rng.random() < 0.4:
+            choices[column] = _range(rng, df, column)
+    choices["DEATH"] = str(rng.choice(["All", "YES", "NO"]))
+    if choices["DEATH"] == "YES" and rng.random() < 0.5:
+        choices["DATE_OF_DEATH"] = _range(rng, df, "DATE_OF_DEATH")
+    return choices
+
+
+def selected(index, df, spec):
+    return df.index[index.rows(index.select(spec))]
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_random_choices(df, index, seed):
+    choices = random_choices(np.random.default_rng(seed), df)
+    spec = widget_spec(df, choices)
+    expected = chained(df, choices).index
+    assert selected(index, df, spec).equals(expected), choices
+    assert df.index[spec_mask(df, spec)].equals(expected), choices
+
+
+@pytest.mark.parametrize("death", ["YES", "NO"])
+def test_death(df, index, death):
+    choices = {"SEX": [], "DEATH": death}
+    rows = df.loc[selected(index, df, widget_spec(df, choices))]
+    assert len(rows)
+    assert rows["DATE_OF_DEATH"].notna().all() == (death == "YES")
+    assert rows.index.equals(chained(df, choices).index)
+
+
+def test_origin_and_sector(df, index):
+    choices = {"SEX": [], "DEATH": "All", "ORIGIN": "USA",
+               "SECTOR": ["IMSS", "PEMEX"]}
+    rows = df.loc[selected(index, df, widget_spec(df, choices))]
+    assert len(rows)
+    assert (rows["ORIGIN"] == "USA").all()
+    assert rows["SECTOR"].isin(["IMSS", "PEMEX"]).all()
+    assert rows.index.equals(chained(df, choices).index)
+
+
+def test_untouched_ranges_drop_missing_values(df, index):
+    rows = df.loc[selected(index, df, widget_spec(
+        df, {"SEX": [], "DEATH": "All"}))]
+    assert rows[RANGE_COLUMNS].notna().all().all()
+    assert len(rows) < len(df)
+    assert rows.index.equals(chained(df, {"SEX": [], "DEATH": "All"}).index)
+
+
+def test_range_bounds_are_inclusive(df, index):
+    age = int(df["AGE"].dropna().iloc[0])
+    rows = df.loc[selected(index, df, canonical([
+        ("AGE", "between", (age, age))]))]
+    assert len(rows) and (rows["AGE"] == age).all()
+    assert len(rows) == (df["AGE"] == age).sum()
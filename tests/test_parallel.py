@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from component import parallel
+from component.ingest import read_source, write_dataset
+from component.loader import dataset_files
+from component.streaming import aggregate
+
+# parallel.aggregate_parallel() over worker processes against one pass of
+# streaming.aggregate() in this process, on a Parquet dataset of the test
+# cases
+
+SPECS = [
+    (),
+    (("SEX", "in", ("FEMALE",)), ("AGE", "between", (20, 70))),
+    (("DATE_OF_DEATH", "notnull", True), ("ICU", "==", "YES")),
+]
+
+
+@pytest.fixture(scope="module")
+def dataset(cases_csv, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("dataset") / "cases")
+    write_dataset(read_source(cases_csv), path)
+    return path
+
+
+def test_split():
+    files = [("a", 50), ("b", 10), ("c", 40), ("d", 30), ("e", 20)]
+    groups = parallel.split(files, 3)
+    assert sorted(sum(groups, [])) == ["a", "b", "c", "d", "e"]
+    rows = dict(files)
+    assert sorted(sum(rows[f] for f in group) for group in groups) == [
+        50, 50, 50]
+    assert parallel.split(files[:2], 3) == [["a"], ["b"]]
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_workers_match_one_process(dataset, monkeypatch, spec):
+    # Small enough for one process otherwise
+    monkeypatch.setattr(parallel, "MIN_ROWS", 0)
+    assert len(dataset_files(dataset)) > 4
+    assert parallel.use_workers(dataset, 2)
+    got = parallel.aggregate_parallel(spec, dataset, workers=2,
+                                      chunk_rows=256).results()
+    expected = aggregate(spec, dataset).results()
+    assert got["rows"] == expected["rows"] > 0
+    pd.testing.assert_series_equal(got["age_groups"],
+                                   expected["age_groups"])
+    for values, counts in zip(got["ages"], expected["ages"]):
+        np.testing.assert_array_equal(values, counts)
+    pd.testing.assert_series_equal(got["intubated"], expected["intubated"])
+    np.testing.assert_array_equal(got["comorbidity"].counts,
+                                  expected["comorbidity"].counts)
+    assert got["cube"] is None
+
+
+def test_small_data_stays_in_process(dataset):
+    assert not parallel.use_workers(dataset, 2)
+    assert not parallel.use_workers(dataset, 1)
@@ -0,0 +1,115 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from component.cube import build_cube
+from component.filter import FILTER_COLUMNS
+from component.filter_index import FilterIndex
+from component.filter_spec import canonical
+from component.loader import read_data
+from component.selection import FrameSelection, StoreSelection
+from component.sql_store import Store, build_store
+
+# StoreSelection and the Store's FilterIndex interface against a
+# FrameSelection and FilterIndex of the same rows, for the same specs
+
+SPECS = [
+    (),
+    (("SEX", "in", ("MALE", "UNKNOWN")), ("PNEUMONIA", "==", "YES")),
+    (("AGE", "between", (0, 17)),),
+    (("DATE_OF_DEATH", "between", (datetime.date(2020, 4, 1),
+                                   datetime.date(2020, 12, 31))),
+     ("ORIGIN", "==", "USA")),
+    (("DATE_OF_DEATH", "isnull", True), ("HOSPITALIZED", "==", "NO"),
+     ("DATE_OF_FIRST_SYMPTOM", "between", (datetime.date(2020, 6, 1),
+                                           datetime.date(2020, 6, 30)))),
+]
+
+DISEASES = ["DIABETES", "COPD", "ASTHMA", "HYPERTENSION", "OBESITY"]
+
+
+@pytest.fixture(scope="module")
+def df(cases_csv):
+    return read_data(cases_csv)
+
+
+@pytest.fixture(scope="module")
+def store(cases_csv, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("store") / "cases.sqlite")
+    build_store(cases_csv, path)
+    return Store(path)
+
+
+@pytest.fixture(scope="module")
+def index(df):
+    return FilterIndex(df[FILTER_COLUMNS])
+
+
+def selections(df, store, index, spec):
+    spec = canonical(spec)
+    rows = index.rows(index.select(spec))
+    return (StoreSelection(store, spec, df.columns),
+            FrameSelection(df, rows))
+
+
+def test_build_store(df, store):
+    assert store.columns == list(df.columns)
+    assert store.count(()) == len(df)
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_aggregations(df, store, index, spec):
+    selection, expected = selections(df, store, index, spec)
+    assert len(selection) == len(expected) > 0
+    pd.testing.assert_series_equal(selection.age_group_counts(),
+                                   expected.age_group_counts())
+    for got, value in zip(selection.distinct_counts("AGE"),
+                          expected.distinct_counts("AGE")):
+        np.testing.assert_array_equal(got, value)
+    for column in ["SEX", "SECTOR", "INTUBATED", "OUTCOME"]:
+        # Pages only read the labels, counts and order
+        assert (list(selection.value_counts(column).items())
+                == list(expected.value_counts(column).items())), column
+    pd.testing.assert_series_equal(selection.yes_counts(DISEASES),
+                                   expected.yes_counts(DISEASES))
+    where = (("ICU", "==", "YES"),)
+    pd.testing.assert_series_equal(selection.yes_counts(DISEASES, where),
+                                   expected.yes_counts(DISEASES, where))
+    np.testing.assert_array_equal(selection.comorbidity().counts,
+                                  expected.comorbidity().counts)
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_filter_index_interface(df, store, index, spec):
+    spec = canonical(spec)
+    selected = index.select(spec)
+    assert store.count(store.select(spec)) == index.count(selected)
+    for column in ["AGE", "DATE_OF_FIRST_SYMPTOM", "ADMISSION DATE",
+                   "DATE_OF_DEATH"]:
+        for fn in ["min", "max"]:
+            got = getattr(store, fn)(column, spec)
+            expected = getattr(index, fn)(column, selected)
+            assert got == expected or (pd.isna(got) and pd.isna(expected))
+    columns = ["SEX", "ORIGIN", "SECTOR", "ICU", "OUTCOME"]
+    assert (store.facet_counts(columns, spec)
+            == index.facet_counts(columns, selected))
+
+
+def test_cube(df, store):
+    pd.testing.assert_frame_equal(store.cube(), build_cube(df))
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_sorted_rows(df, store, index, descending):
+    spec = canonical(SPECS[1])
+    columns = ["SEX", "AGE", "SECTOR", "ADMISSION DATE"]
+    rows = index.rows(index.select(spec))
+    expected = df.iloc[rows][columns].sort_values(
+        "AGE", ascending=not descending, kind="stable", na_position="last")
+    got = store.rows(spec, columns, sort_by="AGE", descending=descending,
+                     start=10, stop=60)
+    pd.testing.assert_frame_equal(
+        got, expected.iloc[10:60].reset_index(drop=True), check_dtype=False,
+        check_categorical=False)
@@ -0,0 +1,64 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from component.cube import SOURCE_COLUMNS, build_cube, merge_cubes
+from component.filter_spec import canonical, spec_mask
+from component.loader import read_chunks, read_data
+from component.selection import FrameSelection
+from component.streaming import COLUMNS, aggregate_chunks
+
+# streaming.aggregate_chunks() over chunks of any size against the same
+# aggregations of a FrameSelection holding all the rows
+
+SPECS = [
+    (),
+    (("SEX", "in", ("FEMALE",)),),
+    (("AGE", "between", (30, 60)), ("ICU", "==", "YES")),
+    (("DATE_OF_DEATH", "notnull", True), ("SECTOR", "in", ("IMSS", "SSA"))),
+    (("DATE_OF_DEATH", "isnull", True),
+     ("ADMISSION DATE", "between", (datetime.date(2020, 3, 1),
+                                    datetime.date(2020, 9, 30)))),
+]
+
+CHUNK_ROWS = [97, 1000, 4096]
+
+
+@pytest.fixture(scope="module")
+def df(cases_csv):
+    return read_data(cases_csv, columns=COLUMNS)
+
+
+def frame_selection(df, spec):
+    return FrameSelection(df, np.flatnonzero(spec_mask(df, spec)))
+
+
+def assert_same_results(results, selection):
+    # Aggregates.results() against the selection the pages would use
+    assert results["rows"] == len(selection)
+    pd.testing.assert_series_equal(results["age_groups"],
+                                   selection.age_group_counts())
+    for got, expected in zip(results["ages"],
+                             selection.distinct_counts("AGE")):
+        np.testing.assert_array_equal(got, expected)
+    # Pages only read the labels, counts and order
+    assert (list(results["intubated"].items())
+            == list(selection.value_counts("INTUBATED").items()))
+    np.testing.assert_array_equal(results["comorbidity"].counts,
+                                  selection.comorbidity().counts)
+
+
+@pytest.mark.parametrize("chunk_rows", CHUNK_ROWS)
+@pytest.mark.parametrize("spec", SPECS)
+def test_chunks_match_frame_selection(cases_csv, df, spec, chunk_rows):
+    spec = canonical(spec)
+    selection = frame_selection(df, spec)
+    assert len(selection)
+    results = aggregate_chunks(
+        read_chunks(cases_csv, COLUMNS, chunk_rows), spec).results()
+    assert_same_results(results, selection)
+    pd.testing.assert_frame_equal(
+        merge_cubes(results["cube"]),
+        merge_cubes(build_cube(selection._frame(SOURCE_COLUMNS))))